@@ -0,0 +1,201 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Benchmark suite for the pricing models
+
+Runs on synthetic option chains, no network or database needed:
+    python benchmark.py --num_options 100000 --output bench.json
+
+'''
+
+import os
+import sys
+import json
+import time
+import datetime
+import platform
+import subprocess
+import tracemalloc
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+import option
+from stock import Stock
+from financial_option import *
+from option_book import OptionBook
+from blackscholes_model import BlackScholesModel
+from binomial_model import BinomialTreeModel
+from finite_difference_model import FiniteDifferenceModel
+from monte_carlo_model import MonteCarloModel
+
+
+def make_synthetic_book(num_options, num_underlyings, seed = 0, american_fraction = 0.0):
+    '''
+    random chain over num_underlyings synthetic stocks, strikes within +-30% of spot
+    and expiries on a monthly listing cycle out to two years
+    '''
+    rng = np.random.default_rng(seed)
+    stocks = [Stock(None, None, f"SYN{i:04d}", spot_price = rng.uniform(20, 500), sigma = rng.uniform(0.1, 0.8),
+                    dividend_yield = rng.uniform(0, 0.03)) for i in range(num_underlyings)]
+    underlying_id = rng.integers(0, num_underlyings, num_options)
+    spot = np.array([s.spot_price for s in stocks])
+    return OptionBook(option_type = rng.integers(0, 2, num_options),
+                      option_style = rng.random(num_options) < american_fraction,
+                      strike = spot[underlying_id] * rng.uniform(0.7, 1.3, num_options),
+                      time_to_expiry = rng.integers(1, 25, num_options) / 12,
+                      underlying_id = underlying_id, underlyings = stocks)
+
+
+class BenchmarkResult(object):
+    def __init__(self, name, mode, num_ops, latencies, peak_bytes):
+        self.name = name
+        self.mode = mode
+        self.num_ops = num_ops
+        self.latencies = np.asarray(latencies)
+        self.peak_bytes = peak_bytes
+
+    def to_dict(self):
+        total = self.latencies.sum()
+        return {'name': self.name, 'mode': self.mode, 'num_ops': self.num_ops, 'calls': len(self.latencies),
+                'ops_per_sec': self.num_ops / total if total > 0 else None,
+                'latency_us': {p: float(np.percentile(self.latencies, q) * 1e6)
+                               for p, q in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))},
+                'peak_memory_mb': self.peak_bytes / 1024 ** 2 if self.peak_bytes is not None else None}
+
+
+def run_benchmark(name, mode, func, args_list, ops_per_call):
+    '''
+    time func(*args) for every args in args_list, recording per-call latency,
+    then repeat the first call under tracemalloc for its peak memory (tracing slows the calls down).
+    tracemalloc only sees this process, so the parallel modes record no peak memory rather than a false one
+    '''
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - start)
+
+    peak = None
+    if mode != 'parallel':
+        tracemalloc.start()
+        func(*args_list[0])
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result = BenchmarkResult(name, mode, ops_per_call * len(args_list), latencies, peak)
+    d = result.to_dict()
+    peak_mb = f"{d['peak_memory_mb']:>8.1f} MB" if d['peak_memory_mb'] is not None else f"{'n/a':>8}"
+    print(f"{name:<22} {mode:<9} {d['ops_per_sec']:>16,.0f} ops/sec  p50 {d['latency_us']['p50']:>12,.1f} us"
+          f"  peak {peak_mb}")
+    return result
+
+
+def _price_chunk(task):
+    # worker for the parallel mode, prices one chunk of the book arrays
+    risk_free_rate, S0, K, T, sigma, q, is_call = task
+    return BlackScholesModel(None, risk_free_rate).calc_price_and_greeks(S0, K, T, sigma, q, is_call)
+
+def _parallel_greeks(executor, tasks):
+    return list(executor.map(_price_chunk, tasks))
+
+
+def inputs_of(book):
+    # positional batch inputs (spot, strike, time_to_expiry, sigma, dividend_yield, is_call) of a book
+    arrays = book.option_arrays()
+    return (arrays.spot, arrays.strike, arrays.time_to_expiry, arrays.sigma, arrays.dividend_yield, arrays.is_call)
+
+def run_suite(opt):
+    r = 0.05
+    bs_model = BlackScholesModel(datetime.date(2023, 12, 8), r)
+    book = make_synthetic_book(opt.num_options, opt.num_underlyings, seed = opt.seed)
+    inputs = inputs_of(book)
+    singles = book[:opt.num_single].to_options()
+    results = []
+
+    # Black-Scholes price and Greeks
+    for name, method in (('bs_price', bs_model.calc_model_price), ('bs_delta', bs_model.calc_delta),
+                         ('bs_gamma', bs_model.calc_gamma), ('bs_theta', bs_model.calc_theta),
+                         ('bs_vega', bs_model.calc_vega), ('bs_rho', bs_model.calc_rho)):
+        results.append(run_benchmark(name, 'single', method, [(o,) for o in singles], 1))
+    results.append(run_benchmark('bs_price', 'batch', bs_model.calc_model_price_batch,
+                                 [inputs] * opt.repeat, len(book)))
+    results.append(run_benchmark('bs_price_greeks', 'batch', bs_model.calc_price_and_greeks,
+                                 [inputs] * opt.repeat, len(book)))
+
+    chunk = -(-len(book) // opt.workers)
+    tasks = [tuple([r] + [x[i:i + chunk] for x in inputs]) for i in range(0, len(book), chunk)]
+    with ProcessPoolExecutor(max_workers = opt.workers) as executor:
+        _parallel_greeks(executor, tasks)  # warm up the pool
+        results.append(run_benchmark('bs_price_greeks', 'parallel', _parallel_greeks,
+                                     [(executor, tasks)] * opt.repeat, len(book)))
+
+    # American engines on smaller samples
+    american = make_synthetic_book(opt.num_american, opt.num_underlyings, seed = opt.seed, american_fraction = 1.0)
+    american_inputs = inputs_of(american)
+    tree = BinomialTreeModel(bs_model.pricing_date, r, num_steps = opt.tree_steps)
+    results.append(run_benchmark('binomial_american', 'single', tree.calc_model_price,
+                                 [(o,) for o in american[:opt.num_single // 10].to_options()], 1))
+    results.append(run_benchmark('binomial_american', 'batch', tree.calc_model_price_batch,
+                                 [american_inputs + (None, True)], len(american)))
+    fd_model = FiniteDifferenceModel(bs_model.pricing_date, r)
+    fd_inputs = inputs_of(american[:opt.num_fd])
+    results.append(run_benchmark('fd_american', 'batch', fd_model.calc_price_and_greeks,
+                                 [fd_inputs + (None, True)], len(fd_inputs[0])))
+
+    # Monte Carlo, throughput reported in options priced
+    mc_option = singles[0]
+    for mode, workers in (('single', 1), ('parallel', opt.workers)):
+        mc_model = MonteCarloModel(bs_model.pricing_date, r, num_paths = opt.mc_paths, num_workers = workers,
+                                   variance_reduction = MonteCarloModel.ANTITHETIC, seed = opt.seed)
+        results.append(run_benchmark('monte_carlo', mode, mc_model.calc_model_price, [(mc_option,)] * 3, 1))
+
+    return results
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)),
+                                       stderr = subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run():
+    parser = option.get_default_parser()
+    parser.add_argument('--num_options', dest = 'num_options', type = int, default = 100000, help = 'batch size')
+    parser.add_argument('--num_underlyings', dest = 'num_underlyings', type = int, default = 500,
+                        help = 'number of synthetic underlyings')
+    parser.add_argument('--num_single', dest = 'num_single', type = int, default = 2000,
+                        help = 'options timed one at a time')
+    parser.add_argument('--num_american', dest = 'num_american', type = int, default = 2000,
+                        help = 'options for the American engines')
+    parser.add_argument('--num_fd', dest = 'num_fd', type = int, default = 100,
+                        help = 'options for the finite difference engine')
+    parser.add_argument('--tree_steps', dest = 'tree_steps', type = int, default = 500, help = 'binomial steps')
+    parser.add_argument('--mc_paths', dest = 'mc_paths', type = int, default = 1000000, help = 'Monte Carlo paths')
+    parser.add_argument('--repeat', dest = 'repeat', type = int, default = 5, help = 'batch repetitions')
+    parser.add_argument('--workers', dest = 'workers', type = int, default = os.cpu_count() or 1,
+                        help = 'processes for the parallel mode')
+    parser.add_argument('--seed', dest = 'seed', type = int, default = 0, help = 'random seed')
+    parser.add_argument('--output', dest = 'output', default = 'benchmark.json', help = 'JSON output file')
+
+    args = parser.parse_args()
+    opt = option.Option(args = args)
+
+    results = run_suite(opt)
+    report = {'timestamp': datetime.datetime.now().isoformat(), 'commit': git_commit(),
+              'python': sys.version.split()[0], 'numpy': np.__version__, 'machine': platform.platform(),
+              'config': {k: getattr(opt, k) for k in ('num_options', 'num_underlyings', 'num_single', 'num_american',
+                                                      'num_fd', 'tree_steps', 'mc_paths', 'repeat', 'workers', 'seed')},
+              'results': [x.to_dict() for x in results]}
+    with open(opt.output, 'w') as f:
+        json.dump(report, f, indent = 2)
+    print(f"Results written to {opt.output}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,163 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Binomial Tree Model
+
+'''
+
+import datetime
+import numpy as np
+
+from stock import Stock
+from financial_option import *
+from blackscholes_model import BlackScholesModel, option_arrays
+
+
+class BinomialTreeModel(object):
+    '''
+    Binomial lattice for pricing European and American options
+
+    method is either CRR (Cox-Ross-Rubinstein) or JR (Jarrow-Rudd).
+    Contracts are priced in chunks of chunk_size; each chunk does its backward induction over
+    a few (num_steps + 1, chunk_size) buffers that are reused at every step,
+    so memory grows linearly with the number of steps
+    '''
+
+    CRR = 'CRR'
+    JR = 'JR'
+
+    def __init__(self, pricing_date, risk_free_rate, num_steps = 500, method = 'CRR', chunk_size = 64):
+        self.pricing_date = pricing_date
+        self.risk_free_rate = risk_free_rate
+        self.num_steps = num_steps
+        self.method = method
+        self.chunk_size = chunk_size
+
+    def calc_model_price(self, option):
+        '''
+        Calculate the price of a European or American option on the tree
+        '''
+        return(float(self.calc_model_price_batch([option])[0]))
+
+    def calc_model_price_batch(self, spot, strike = None, time_to_expiry = None, sigma = None,
+                               dividend_yield = 0.0, is_call = True, risk_free_rate = None, is_american = False):
+        '''
+        Price a batch of contracts on the tree
+
+        Inputs follow BlackScholesModel.calc_model_price_batch, is_american is a boolean array
+        with True for American and False for European exercise.
+        spot can also be a list of FinancialOption objects.
+        Returns an array of prices
+        '''
+        if strike is None:
+            arrays = option_arrays(spot)
+            spot, strike, time_to_expiry = arrays.spot, arrays.strike, arrays.time_to_expiry
+            sigma, dividend_yield = arrays.sigma, arrays.dividend_yield
+            is_call, is_american = arrays.is_call, arrays.is_american
+
+        r = self.risk_free_rate if risk_free_rate is None else risk_free_rate
+        S0, K, T, sigma, q, r = np.broadcast_arrays(*[np.asarray(x, dtype = float) for x in
+                                                      (spot, strike, time_to_expiry, sigma, dividend_yield, r)])
+        is_call = np.broadcast_to(np.asarray(is_call, dtype = bool), S0.shape)
+        is_american = np.broadcast_to(np.asarray(is_american, dtype = bool), S0.shape)
+        shape = S0.shape
+        S0, K, T, sigma, q, r, is_call, is_american = [np.ravel(x) for x in
+                                                       (S0, K, T, sigma, q, r, is_call, is_american)]
+
+        px = np.empty(S0.shape[0])
+        # American and European contracts go through separate inductions so neither pays for the other
+        for american in (False, True):
+            idx = np.flatnonzero(is_american == american)
+            for start in range(0, idx.shape[0], self.chunk_size):
+                chunk = idx[start:start + self.chunk_size]
+                px[chunk] = self._induction(S0[chunk], K[chunk], T[chunk], sigma[chunk], q[chunk], r[chunk],
+                                            is_call[chunk], american)
+        return(px.reshape(shape))
+
+    def _tree_parameters(self, T, sigma, q, r):
+        # up/down factors and up probability per contract
+        N = self.num_steps
+        dt = T / N
+        if self.method == BinomialTreeModel.CRR:
+            u = np.exp(sigma * np.sqrt(dt))
+            d = 1 / u
+            p = (np.exp((r - q) * dt) - d) / (u - d)
+        elif self.method == BinomialTreeModel.JR:
+            drift = (r - q - sigma ** 2 / 2) * dt
+            u = np.exp(drift + sigma * np.sqrt(dt))
+            d = np.exp(drift - sigma * np.sqrt(dt))
+            p = np.full(T.shape, 0.5)
+        else:
+            raise Exception(f"Unsupported binomial method {self.method}")
+        return(u, d, p, np.exp(-r * dt))
+
+    def _induction(self, S0, K, T, sigma, q, r, is_call, american):
+        '''
+        backward induction for one chunk of contracts, all arrays are 1-d of the chunk length
+        the buffers are laid out (node, contract) so each level of the tree is one contiguous block
+        '''
+        N = self.num_steps
+        u, d, p, disc = self._tree_parameters(T, sigma, q, r)
+        sign = np.where(is_call, 1.0, -1.0)
+        p_up = disc * p
+        p_down = disc * (1 - p)
+        inv_d = 1 / d
+
+        # terminal spot S0 * u^j * d^(N-j) and payoff, j is the number of up moves
+        j = np.arange(N + 1)[:, None]
+        S = S0 * np.exp(j * np.log(u) + (N - j) * np.log(d))
+        V = np.maximum(sign * (S - K), 0.0)
+        work = np.empty_like(V)
+
+        for i in range(N - 1, -1, -1):
+            # V_i[j] = disc * (p * V_i+1[j+1] + (1-p) * V_i+1[j]), all in place over the first i+1 nodes
+            v, w = V[:i + 1], work[:i + 1]
+            np.multiply(V[1:i + 2], p_up, out = w)
+            np.multiply(v, p_down, out = v)
+            np.add(v, w, out = v)
+            if american:
+                # step the spot back one level, S_i[j] = S_i+1[j] / d, and take early exercise
+                s = S[:i + 1]
+                np.multiply(s, inv_d, out = s)
+                np.subtract(s, K, out = w)
+                np.multiply(w, sign, out = w)
+                np.maximum(v, w, out = v)
+
+        return(V[0].copy())
+
+
+def _test():
+    import time
+
+    pricing_date = datetime.date(2023, 12, 8)
+    r = 0.1
+    stock = Stock(None, None, 'AAPL', spot_price = 50, sigma = 0.4)
+    bs_model = BlackScholesModel(pricing_date, r)
+
+    # Hull's American put example, S0 = K = 50, r = 10%, sigma = 40%, T = 5 months
+    american_put = AmericanPutOption(stock, time_to_expiry = 5 / 12, strike = 50)
+    european_put = EuropeanPutOption(stock, time_to_expiry = 5 / 12, strike = 50)
+    for method in (BinomialTreeModel.CRR, BinomialTreeModel.JR):
+        for steps in (5, 100, 2000):
+            tree = BinomialTreeModel(pricing_date, r, num_steps = steps, method = method)
+            print(f"{method} {steps} steps American Put: {tree.calc_model_price(american_put):.6f}"
+                  f" European Put: {tree.calc_model_price(european_put):.6f}")
+    print('B\\S European Put:', bs_model.calc_model_price(european_put))
+
+    # a batch of American contracts on a deep tree
+    n = 1000
+    rng = np.random.default_rng(0)
+    tree = BinomialTreeModel(pricing_date, r, num_steps = 1000)
+    start = time.time()
+    px = tree.calc_model_price_batch(rng.uniform(40, 60, n), 50.0, rng.uniform(0.1, 2.0, n),
+                                     rng.uniform(0.1, 0.5, n), 0.01, rng.random(n) < 0.5, is_american = True)
+    print(f"Priced {n} American options with 1000 steps in {time.time() - start:.3f} seconds")
+
+
+if __name__ == "__main__":
+    _test()
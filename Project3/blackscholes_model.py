@@ -12,20 +12,52 @@ Black-Schole Model
 
 import datetime
 from datetime import date
+import numpy as np
 from scipy.stats import norm
+from scipy.special import ndtr
 from math import log, exp, sqrt
 
 from stock import Stock
 from financial_option import *
+from daycount import year_fraction, ACT_365
 
 class BlackScholesModel(object):
     '''
     Implementation of the Black-Schole Model for pricing European options
+
+    American options can be priced with an analytic approximation by setting american_approximation to
+        baw                 : Barone-Adesi and Whaley (1987) quadratic approximation
+        bjerksund_stensland : Bjerksund and Stensland (1993) flat exercise boundary
+    Only prices use the approximation, the analytic Greeks remain European only
+
+    Volatility surfaces registered with set_vol_surface replace the Stock sigma of their underlying
+    when the batch methods are given options, each contract then gets the surface vol at its strike and expiry
     '''
 
-    def __init__(self, pricing_date, risk_free_rate):
+    BARONE_ADESI_WHALEY = 'baw'
+    BJERKSUND_STENSLAND = 'bjerksund_stensland'
+
+    def __init__(self, pricing_date, risk_free_rate, american_approximation = None):
         self.pricing_date = pricing_date
         self.risk_free_rate = risk_free_rate
+        if american_approximation not in (None, BlackScholesModel.BARONE_ADESI_WHALEY,
+                                          BlackScholesModel.BJERKSUND_STENSLAND):
+            raise Exception(f"Unsupported American approximation {american_approximation}")
+        self.american_approximation = american_approximation
+        self.vol_surfaces = {}
+
+    def set_vol_surface(self, ticker, surface):
+        # surface is a VolatilitySurface, None removes it
+        if surface is None:
+            self.vol_surfaces.pop(ticker, None)
+        else:
+            self.vol_surfaces[ticker] = surface
+
+    def calc_time_to_expiry(self, expiry, convention = ACT_365, calendar = None):
+        '''
+        year fractions from the pricing_date to an expiry date or an array of them, in one vectorized call
+        '''
+        return(year_fraction(self.pricing_date, expiry, convention, calendar))
 
     def calc_parity_price(self, option, option_price):
         '''
@@ -45,27 +77,103 @@ class BlackScholesModel(object):
         '''
         Calculate the price of the option using Black-Scholes model
         '''
-        px = None
-        if option.option_style == FinancialOption.Style.AMERICAN:
+        if option.option_style == FinancialOption.Style.AMERICAN and self.american_approximation is None:
             raise Exception("B\S price for American option not implemented yet")
-        else:
-            S0 = option.underlying.spot_price
-            sigma = option.underlying.sigma
-            T = option.time_to_expiry
-            K = option.strike
-            q = option.underlying.dividend_yield
-            r = self.risk_free_rate
-
-            d1 = (log(S0/K)+(r-q+pow(sigma, 2)/2)*T)/(sigma * sqrt(T))
-            d2 = d1 - sigma * sqrt(T)
 
-            if option.option_type == FinancialOption.Type.CALL:
-                px = S0 * exp(-q * T) * norm.cdf(d1) - K * exp(-r * T) * norm.cdf(d2)
-            elif option.option_type == FinancialOption.Type.PUT:
-                px = K * exp(-r * T) * norm.cdf(-d2) - S0 * exp(-q * T) * norm.cdf(-d1)
+        # the scalar price goes through the same kernel as the batch so both agree to the last bit
+        px = self.calc_model_price_batch([option])[0]
+        return(float(px))
 
+    def calc_model_price_batch(self, spot, strike = None, time_to_expiry = None, sigma = None,
+                               dividend_yield = 0.0, is_call = True, risk_free_rate = None, is_american = False):
+        '''
+        Calculate Black-Scholes prices for a whole chain in one vectorized pass
+
+        spot, strike, time_to_expiry, sigma, dividend_yield are arrays (or scalars) that broadcast together,
+        is_call is a boolean array with True for calls and False for puts.
+        spot can also be a list of FinancialOption objects, in which case all inputs are taken from the options.
+        risk_free_rate defaults to the model rate.
+        is_american flags the contracts priced with the american_approximation of the model.
+        Returns an array of prices
+        '''
+        if strike is None:
+            arrays = self._option_arrays(spot)
+            spot, strike, time_to_expiry = arrays.spot, arrays.strike, arrays.time_to_expiry
+            sigma, dividend_yield = arrays.sigma, arrays.dividend_yield
+            is_call, is_american = arrays.is_call, arrays.is_american
+        S0, K, T, sigma, q, is_call, r = self._batch_inputs(spot, strike, time_to_expiry, sigma,
+                                                            dividend_yield, is_call, risk_free_rate)
+        px = _bs_price(S0, K, T, r, q, sigma, is_call)
+
+        american = np.broadcast_to(np.asarray(is_american, dtype = bool), S0.shape)
+        if american.any():
+            if self.american_approximation is None:
+                raise Exception("B\S price for American option not implemented yet")
+            approximation = _baw_price if self.american_approximation == BlackScholesModel.BARONE_ADESI_WHALEY \
+                else _bjerksund_stensland_price
+            px = np.array(px, dtype = float, ndmin = 1)
+            american = american.reshape(px.shape)
+            px[american] = approximation(*[np.reshape(x, px.shape)[american] for x in (S0, K, T, r, q, sigma, is_call)])
+            px = px.reshape(S0.shape)
         return(px)
 
+    def calc_price_and_greeks(self, spot, strike = None, time_to_expiry = None, sigma = None,
+                              dividend_yield = 0.0, is_call = True, risk_free_rate = None):
+        '''
+        Calculate price, delta, gamma, theta, vega and rho together in a single pass,
+        sharing d1/d2, the discount factors and the normal pdf/cdf between them
+
+        Takes the same inputs as calc_model_price_batch, or a single FinancialOption.
+        Returns a structured array with GREEKS_DTYPE fields, or a single record for a single option
+        '''
+        if isinstance(spot, FinancialOption):
+            return(self.calc_price_and_greeks([spot])[0])
+
+        S0, K, T, sigma, q, is_call, r = self._batch_inputs(spot, strike, time_to_expiry, sigma,
+                                                            dividend_yield, is_call, risk_free_rate)
+        return(_bs_price_and_greeks(S0, K, T, r, q, sigma, is_call))
+
+    def _batch_inputs(self, spot, strike, time_to_expiry, sigma, dividend_yield, is_call, risk_free_rate):
+        '''
+        normalize the batch inputs into broadcast float arrays (and a boolean is_call array)
+        '''
+        if strike is None:
+            arrays = self._option_arrays(spot)
+            if arrays.is_american.any():
+                raise Exception("B\S price for American option not implemented yet")
+            spot, strike, time_to_expiry = arrays.spot, arrays.strike, arrays.time_to_expiry
+            sigma, dividend_yield, is_call = arrays.sigma, arrays.dividend_yield, arrays.is_call
+
+        r = self.risk_free_rate if risk_free_rate is None else risk_free_rate
+        S0, K, T, sigma, q, r = np.broadcast_arrays(*[np.asarray(x, dtype = float) for x in
+                                                      (spot, strike, time_to_expiry, sigma, dividend_yield, r)])
+        is_call = np.broadcast_to(np.asarray(is_call, dtype = bool), S0.shape)
+        return(S0, K, T, sigma, q, is_call, r)
+
+    def _option_arrays(self, options):
+        '''
+        option_arrays with the sigma of every underlying that has a volatility surface looked up per contract
+        '''
+        arrays = option_arrays(options)
+        # books built from spot and sigma arrays have no Stock objects to look the surfaces up by
+        if not self.vol_surfaces or arrays.underlyings is None:
+            return(arrays)
+        arrays.sigma = np.array(arrays.sigma, dtype = float)
+        # one vectorized lookup per underlying, contracts grouped with a stable sort on underlying_id
+        order = np.argsort(arrays.underlying_id, kind = 'stable')
+        ids, starts = np.unique(arrays.underlying_id[order], return_index = True)
+        for u, idx in zip(ids, np.split(order, starts[1:])):
+            surface = self.vol_surfaces.get(arrays.underlyings[u].ticker)
+            if surface is not None:
+                arrays.sigma[idx] = surface.vol(arrays.strike[idx], arrays.time_to_expiry[idx])
+        return(arrays)
+
+    def _option_sigma(self, option):
+        # the volatility of a single option, from the surface of its underlying when one is set
+        if not self.vol_surfaces:
+            return(option.underlying.sigma)
+        return(float(self._option_arrays([option]).sigma[0]))
+
     def calc_delta(self, option):
         if option.option_style == FinancialOption.Style.AMERICAN:
             raise Exception("B\S price for American option not implemented yet")
@@ -75,7 +183,7 @@ class BlackScholesModel(object):
             T = option.time_to_expiry
             r = self.risk_free_rate
             q = option.underlying.dividend_yield
-            sigma = option.underlying.sigma
+            sigma = self._option_sigma(option)
             
             d1 = (log(S_0/K)+(r-q+pow(sigma, 2)/2)*T)/(sigma * sqrt(T))
             if option.option_type == FinancialOption.Type.CALL:
@@ -96,7 +204,7 @@ class BlackScholesModel(object):
             T = option.time_to_expiry
             r = self.risk_free_rate
             q = option.underlying.dividend_yield
-            sigma = option.underlying.sigma
+            sigma = self._option_sigma(option)
             
             d1 = (log(S_0 / K) + (r - q + pow(sigma, 2) / 2) * T) / (sigma * sqrt(T))
             result = exp(-q * T) * norm.pdf(d1) / (S_0 * sigma * sqrt(T)) #Put & Call are the same
@@ -114,7 +222,7 @@ class BlackScholesModel(object):
             T = option.time_to_expiry
             r = self.risk_free_rate
             q = option.underlying.dividend_yield
-            sigma = option.underlying.sigma
+            sigma = self._option_sigma(option)
             d1 = (np.log(S_0 / K) + (r - q + sigma ** 2 / 2) * T) / (sigma * sqrt(T))
             d2 = d1 - sigma * sqrt(T)
 
@@ -122,7 +230,7 @@ class BlackScholesModel(object):
                 result = (-S_0 * norm.pdf(d1) * sigma * exp(-q * T)) / (2 * sqrt(T)) + \
                     (q * S_0 * norm.cdf(d1) * exp(-q * T)) - (r * K * exp(-r * T) * norm.cdf(d2))
             elif option.option_type == FinancialOption.Type.PUT:
-                result = (norm.pdf(d1) * exp(-q * T)) / (S_0 * sigma * sqrt(T)) - \
+                result = (-S_0 * norm.pdf(d1) * sigma * exp(-q * T)) / (2 * sqrt(T)) - \
                     (q * S_0 * norm.cdf(-d1) * exp(-q * T)) + (r * K * exp(-r * T) * norm.cdf(-d2))
         else:
             raise Exception("Unsupported option type")
@@ -139,7 +247,7 @@ class BlackScholesModel(object):
             T = option.time_to_expiry
             r = self.risk_free_rate
             q = option.underlying.dividend_yield
-            sigma = option.underlying.sigma
+            sigma = self._option_sigma(option)
             d1 = (np.log(S_0 / K) + (r - q + sigma ** 2 / 2) * T) / (sigma * sqrt(T))
 
             d1 = (log(S_0 / K) + (r - q + pow(sigma, 2) / 2) * T) / (sigma * sqrt(T))
@@ -158,7 +266,7 @@ class BlackScholesModel(object):
             T = option.time_to_expiry
             r = self.risk_free_rate
             q = option.underlying.dividend_yield
-            sigma = option.underlying.sigma
+            sigma = self._option_sigma(option)
             d1 = (np.log(S_0 / K) + (r - q + sigma ** 2 / 2) * T) / (sigma * sqrt(T))
             d2 = d1 - sigma * sqrt(T)
 
@@ -171,6 +279,165 @@ class BlackScholesModel(object):
         return result
 
 
+# record layout returned by BlackScholesModel.calc_price_and_greeks
+GREEKS_DTYPE = np.dtype([('price', 'f8'), ('delta', 'f8'), ('gamma', 'f8'),
+                         ('theta', 'f8'), ('vega', 'f8'), ('rho', 'f8')])
+
+class OptionArrays(object):
+    '''
+    column arrays extracted from a list of FinancialOption objects or an OptionBook,
+    underlying_id indexes each contract's Stock in underlyings
+    '''
+    def __init__(self, spot, strike, time_to_expiry, sigma, dividend_yield, is_call, is_american,
+                 underlying_id = None, underlyings = None):
+        self.spot = spot
+        self.strike = strike
+        self.time_to_expiry = time_to_expiry
+        self.sigma = sigma
+        self.dividend_yield = dividend_yield
+        self.is_call = is_call
+        self.is_american = is_american
+        self.underlying_id = underlying_id
+        self.underlyings = underlyings
+
+def option_arrays(options):
+    '''
+    convert a list of FinancialOption objects into the arrays used by the batch pricing methods
+    columnar containers such as OptionBook provide their own option_arrays method
+    '''
+    if hasattr(options, 'option_arrays'):
+        return options.option_arrays()
+    options = list(options)
+    underlyings, ids = [], {}
+    for o in options:
+        if id(o.underlying) not in ids:
+            ids[id(o.underlying)] = len(underlyings)
+            underlyings.append(o.underlying)
+    return OptionArrays(
+        spot = np.array([o.underlying.spot_price for o in options], dtype = float),
+        strike = np.array([o.strike for o in options], dtype = float),
+        time_to_expiry = np.array([o.time_to_expiry for o in options], dtype = float),
+        sigma = np.array([o.underlying.sigma for o in options], dtype = float),
+        dividend_yield = np.array([o.underlying.dividend_yield for o in options], dtype = float),
+        is_call = np.array([o.option_type == FinancialOption.Type.CALL for o in options], dtype = bool),
+        is_american = np.array([o.option_style == FinancialOption.Style.AMERICAN for o in options], dtype = bool),
+        underlying_id = np.array([ids[id(o.underlying)] for o in options], dtype = np.int32),
+        underlyings = underlyings)
+
+def _d1_d2(S0, K, T, r, q, sigma):
+    # d1 and d2 of the Black-Scholes formula, elementwise over arrays
+    sigma_sqrt_T = sigma * np.sqrt(T)
+    d1 = (np.log(S0 / K) + (r - q + sigma ** 2 / 2) * T) / sigma_sqrt_T
+    d2 = d1 - sigma_sqrt_T
+    return(d1, d2)
+
+def _bs_price(S0, K, T, r, q, sigma, is_call):
+    # vectorized Black-Scholes price, calls where is_call is True and puts elsewhere
+    d1, d2 = _d1_d2(S0, K, T, r, q, sigma)
+    sign = np.where(is_call, 1.0, -1.0)
+    px = sign * (S0 * np.exp(-q * T) * ndtr(sign * d1) - K * np.exp(-r * T) * ndtr(sign * d2))
+    return(px)
+
+def _bs_price_and_greeks(S0, K, T, r, q, sigma, is_call):
+    # vectorized price and Greeks, every intermediate term is computed once
+    sqrt_T = np.sqrt(T)
+    d1, d2 = _d1_d2(S0, K, T, r, q, sigma)
+    sign = np.where(is_call, 1.0, -1.0)
+    S_q = S0 * np.exp(-q * T)
+    K_r = K * np.exp(-r * T)
+    N_d1 = ndtr(sign * d1)
+    N_d2 = ndtr(sign * d2)
+    pdf_d1 = np.exp(-d1 ** 2 / 2) / np.sqrt(2 * np.pi)
+
+    result = np.empty(np.shape(S0), dtype = GREEKS_DTYPE)
+    result['price'] = sign * (S_q * N_d1 - K_r * N_d2)
+    result['delta'] = sign * np.exp(-q * T) * N_d1
+    result['gamma'] = S_q * pdf_d1 / (S0 * S0 * sigma * sqrt_T)
+    result['theta'] = -S_q * pdf_d1 * sigma / (2 * sqrt_T) + sign * (q * S_q * N_d1 - r * K_r * N_d2)
+    result['vega'] = S_q * sqrt_T * pdf_d1
+    result['rho'] = sign * T * K_r * N_d2
+    return(result)
+
+
+def _baw_price(S0, K, T, r, q, sigma, is_call, num_iter = 20):
+    '''
+    Barone-Adesi and Whaley American price, the critical spot is found by a vectorized Newton iteration
+    '''
+    S0, K, T, r, q, sigma, is_call = np.broadcast_arrays(S0, K, T, r, q, sigma, is_call)
+    phi = np.where(is_call, 1.0, -1.0)
+    b = r - q
+    sigma_sqrt_T = sigma * np.sqrt(T)
+    carry = np.exp((b - r) * T)
+    M = 2 * r / sigma ** 2
+    N = 2 * b / sigma ** 2
+    # no early exercise premium: calls without dividends and puts when the rate is not positive
+    european_only = (is_call & (q <= 0)) | (~is_call & (r <= 0))
+    with np.errstate(divide = 'ignore', invalid = 'ignore', over = 'ignore'):
+        # M / (1 - exp(-rT)) goes to 2 / (sigma^2 T) as r goes to 0
+        M_T = np.where(r == 0, 2 / (sigma ** 2 * T), M / -np.expm1(-r * T))
+        root = np.sqrt((N - 1) ** 2 + 4 * M_T)
+        q_phi = (-(N - 1) + phi * root) / 2
+        # seed from the perpetual critical spot, which only exists for a positive rate
+        q_inf = np.where(r > 0, (-(N - 1) + phi * np.sqrt((N - 1) ** 2 + 4 * M)) / 2, q_phi)
+        S_inf = K / (1 - 1 / q_inf)
+        h = np.where(phi > 0, -(b * T + 2 * sigma_sqrt_T) * K / (S_inf - K), (b * T - 2 * sigma_sqrt_T) * K / (K - S_inf))
+        S_star = np.where(phi > 0, K + (S_inf - K) * (1 - np.exp(h)), S_inf + (K - S_inf) * np.exp(h))
+
+        # Newton on the contracts that have not converged yet, the active set shrinks every iteration
+        K_r = K * np.exp(-r * T)
+        drift = (b + sigma ** 2 / 2) * T
+        active = np.flatnonzero(~european_only)
+        for _ in range(num_iter):
+            if active.size == 0:
+                break
+            S_a, p_a, c_a, q_a, sst_a = S_star[active], phi[active], carry[active], q_phi[active], sigma_sqrt_T[active]
+            d1 = (np.log(S_a / K[active]) + drift[active]) / sst_a
+            N_d1 = ndtr(p_a * d1)
+            european_star = p_a * (S_a * c_a * N_d1 - K_r[active] * ndtr(p_a * (d1 - sst_a)))
+            g = p_a * (S_a - K[active]) - european_star - p_a * (1 - c_a * N_d1) * S_a / q_a
+            dg = p_a * (1 - c_a * N_d1) * (1 - 1 / q_a) + c_a * np.exp(-d1 ** 2 / 2) / np.sqrt(2 * np.pi) / (sst_a * q_a)
+            step = g / dg
+            S_star[active] = S_a - step
+            active = active[np.abs(step) > 1e-8 * S_a]
+
+        d1 = _d1_d2(S_star, K, T, r, q, sigma)[0]
+        A = phi * S_star / q_phi * (1 - carry * ndtr(phi * d1))
+        european = _bs_price(S0, K, T, r, q, sigma, is_call)
+        px = np.where(phi * (S_star - S0) > 0, european + A * (S0 / S_star) ** q_phi, phi * (S0 - K))
+    return(np.where(european_only, european, px))
+
+def _bjerksund_stensland_price(S0, K, T, r, q, sigma, is_call):
+    '''
+    Bjerksund and Stensland (1993) American price, puts through the transformation P(S, K, r, q) = C(K, S, q, r)
+    '''
+    S, X = np.where(is_call, S0, K), np.where(is_call, K, S0)
+    r, q = np.where(is_call, r, q), np.where(is_call, q, r)
+    return(_bjerksund_stensland_call(S, X, T, r, q, sigma))
+
+def _bjerksund_stensland_call(S, K, T, r, q, sigma):
+    b = r - q
+    sigma2 = sigma ** 2
+    sigma_sqrt_T = sigma * np.sqrt(T)
+    with np.errstate(divide = 'ignore', invalid = 'ignore', over = 'ignore'):
+        beta = (0.5 - b / sigma2) + np.sqrt((b / sigma2 - 0.5) ** 2 + 2 * r / sigma2)
+        B_inf = beta / (beta - 1) * K
+        B_0 = np.where(r - b > 0, np.maximum(K, r / (r - b) * K), K)
+        h = -(b * T + 2 * sigma_sqrt_T) * B_0 / (B_inf - B_0)
+        I = B_0 + (B_inf - B_0) * (1 - np.exp(h))
+        alpha = (I - K) * I ** (-beta)
+
+        def phi(gamma, H):
+            lam = (-r + gamma * b + 0.5 * gamma * (gamma - 1) * sigma2) * T
+            d = -(np.log(S / H) + (b + (gamma - 0.5) * sigma2) * T) / sigma_sqrt_T
+            kappa = 2 * b / sigma2 + 2 * gamma - 1
+            return(np.exp(lam) * S ** gamma * (ndtr(d) - (I / S) ** kappa * ndtr(d - 2 * np.log(I / S) / sigma_sqrt_T)))
+
+        px = alpha * S ** beta - alpha * phi(beta, I) + phi(1, I) - phi(1, K) - K * phi(0, I) + K * phi(0, K)
+        px = np.where(S < I, px, S - K)
+    # without carry advantage the call is never exercised early
+    european = _bs_price(S, K, T, r, q, sigma, True)
+    return(np.where(b >= r, european, np.maximum(px, european)))
+
 
 def _test():
     import option
@@ -236,6 +503,35 @@ def _test():
     print('Vega Put:', vega_put)
     print('Rho Put:', rho_put)
 
+    # price the whole chain in one call
+    chain = [EuropeanCallOption(stock, T, k) for k in range(30, 55, 5)] + \
+            [EuropeanPutOption(stock, T, k) for k in range(30, 55, 5)]
+    print('\nChain Prices:', bs_model.calc_model_price_batch(chain))
+    print('Array Prices:', bs_model.calc_model_price_batch(S0, np.arange(30, 55, 5), T, sigma, 0.0, is_call = True))
+
+    # price and all Greeks in one pass
+    print('\nCall Risk:', bs_model.calc_price_and_greeks(option_call))
+    print('Chain Risk:', bs_model.calc_price_and_greeks(chain)['delta'])
+
+    # American puts with the analytic approximations
+    american_chain = [AmericanPutOption(stock, T, k) for k in range(30, 55, 5)]
+    for approximation in (BlackScholesModel.BARONE_ADESI_WHALEY, BlackScholesModel.BJERKSUND_STENSLAND):
+        american_model = BlackScholesModel(pricing_date, r, american_approximation = approximation)
+        print(f"\nAmerican Put Prices ({approximation}):", american_model.calc_model_price_batch(american_chain))
+
+    # at a zero rate the put has no early exercise premium and the call premium comes from the dividend yield
+    from binomial_model import BinomialTreeModel
+    strikes = np.array([90.0, 100.0, 110.0, 90.0, 100.0, 110.0])
+    is_call = np.array([True, True, True, False, False, False])
+    tree = BinomialTreeModel(pricing_date, 0.0, num_steps = 1000).calc_model_price_batch(
+        np.full(6, 100.0), strikes, 1.0, 0.3, 0.03, is_call, is_american = True)
+    print('\nTree at r = 0:', tree)
+    for approximation in (BlackScholesModel.BARONE_ADESI_WHALEY, BlackScholesModel.BJERKSUND_STENSLAND):
+        zero_rate_model = BlackScholesModel(pricing_date, 0.0, american_approximation = approximation)
+        px = zero_rate_model.calc_model_price_batch(np.full(6, 100.0), strikes, 1.0, 0.3, 0.03, is_call,
+                                                    is_american = True)
+        print(f"{approximation} at r = 0:", px, 'max error', np.abs(px - tree).max())
+
 
 if __name__ == "__main__":
     _test()
@@ -0,0 +1,188 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Bump and Reprice Greeks
+
+'''
+
+import inspect
+import datetime
+import numpy as np
+
+from stock import Stock
+from financial_option import *
+from blackscholes_model import BlackScholesModel, GREEKS_DTYPE, option_arrays
+
+
+class BumpGreeks(object):
+    '''
+    Finite difference Greeks for any pricing model with a calc_model_price_batch method
+
+    All the bumped inputs (spot up/down, vol up/down, one time step, rate up/down) are stacked with the base case
+    into a single array and priced with one call, so n contracts cost one call of 8n prices instead of 8n calls.
+    With a Monte Carlo model every scenario is driven by the same random numbers, which keeps the Greeks
+    from drowning in simulation noise.
+
+    spot_bump is relative to the spot, vol_bump and rate_bump are absolute and time_bump is in years.
+    The vol bump is capped at half the vol, so low vol contracts keep a positive vol in the down scenario.
+    Extra keyword arguments are passed through to calc_model_price_batch.
+    num_calls and num_prices count the pricer invocations and the prices requested
+    '''
+
+    # scenario rows of the stacked inputs
+    BASE, SPOT_UP, SPOT_DOWN, VOL_UP, VOL_DOWN, TIME, RATE_UP, RATE_DOWN = range(8)
+
+    def __init__(self, model, spot_bump = 0.01, vol_bump = 0.01, time_bump = 1 / 365, rate_bump = 0.0001,
+                 **price_kwargs):
+        self.model = model
+        self.spot_bump = spot_bump
+        self.vol_bump = vol_bump
+        self.time_bump = time_bump
+        self.rate_bump = rate_bump
+        self.price_kwargs = price_kwargs
+        self.num_calls = 0
+        self.num_prices = 0
+
+    def calc_model_price(self, option):
+        return float(self.calc_price_and_greeks([option])['price'][0])
+
+    def calc_delta(self, option):
+        return float(self.calc_price_and_greeks([option])['delta'][0])
+
+    def calc_gamma(self, option):
+        return float(self.calc_price_and_greeks([option])['gamma'][0])
+
+    def calc_theta(self, option):
+        return float(self.calc_price_and_greeks([option])['theta'][0])
+
+    def calc_vega(self, option):
+        return float(self.calc_price_and_greeks([option])['vega'][0])
+
+    def calc_rho(self, option):
+        return float(self.calc_price_and_greeks([option])['rho'][0])
+
+    def calc_price_and_greeks(self, spot, strike = None, time_to_expiry = None, sigma = None,
+                              dividend_yield = 0.0, is_call = True, is_american = False):
+        '''
+        Inputs follow BlackScholesModel.calc_price_and_greeks (arrays, a list of FinancialOption objects
+        or an OptionBook), is_american flags the American contracts of array inputs.
+        Returns a GREEKS_DTYPE array with the shape of the broadcast inputs
+        '''
+        price_func = self.model.calc_model_price_batch
+        kwargs = dict(self.price_kwargs)
+        if strike is None:
+            arrays = option_arrays(spot)
+            spot, strike, time_to_expiry = arrays.spot, arrays.strike, arrays.time_to_expiry
+            sigma, dividend_yield, is_call = arrays.sigma, arrays.dividend_yield, arrays.is_call
+            is_american = arrays.is_american
+
+        r = self.model.risk_free_rate
+        S0, K, T, sigma, q, is_call, is_american = np.broadcast_arrays(
+            *[np.asarray(x, dtype = float) for x in (spot, strike, time_to_expiry, sigma, dividend_yield)],
+            np.asarray(is_call, dtype = bool), np.asarray(is_american, dtype = bool))
+        shape = S0.shape
+        S0, K, T, sigma, q, is_call, is_american = [x.ravel() for x in (S0, K, T, sigma, q, is_call, is_american)]
+        # the exercise style is always passed on, the models do not agree on a default
+        if 'is_american' in inspect.signature(price_func).parameters:
+            kwargs['is_american'] = is_american
+        elif is_american.any():
+            raise Exception(f"{type(self.model).__name__} does not price American options")
+
+        # bumped inputs, one row per scenario
+        dS = self.spot_bump * S0
+        # capped at half the vol so the down bump stays positive
+        dv = np.minimum(self.vol_bump, sigma / 2)
+        dt = np.minimum(self.time_bump, T / 2)
+        dr = self.rate_bump
+        n = S0.shape[0]
+        spots = np.tile(S0, (8, 1))
+        spots[BumpGreeks.SPOT_UP] += dS
+        spots[BumpGreeks.SPOT_DOWN] -= dS
+        sigmas = np.tile(sigma, (8, 1))
+        sigmas[BumpGreeks.VOL_UP] += dv
+        sigmas[BumpGreeks.VOL_DOWN] -= dv
+        times = np.tile(T, (8, 1))
+        times[BumpGreeks.TIME] -= dt
+        rates = np.full((8, n), float(r))
+        rates[BumpGreeks.RATE_UP] += dr
+        rates[BumpGreeks.RATE_DOWN] -= dr
+        for key, value in kwargs.items():
+            if np.shape(value) == (n,):
+                kwargs[key] = np.tile(value, 8)
+
+        px = np.asarray(price_func(spots.ravel(), np.tile(K, 8), times.ravel(), sigmas.ravel(), np.tile(q, 8),
+                                   np.tile(is_call, 8), risk_free_rate = rates.ravel(), **kwargs), dtype = float)
+        px = px.reshape(8, n)
+        self.num_calls += 1
+        self.num_prices += px.size
+
+        base = px[BumpGreeks.BASE]
+        result = np.empty(n, dtype = GREEKS_DTYPE)
+        result['price'] = base
+        result['delta'] = (px[BumpGreeks.SPOT_UP] - px[BumpGreeks.SPOT_DOWN]) / (2 * dS)
+        result['gamma'] = (px[BumpGreeks.SPOT_UP] - 2 * base + px[BumpGreeks.SPOT_DOWN]) / dS ** 2
+        result['theta'] = (px[BumpGreeks.TIME] - base) / dt
+        result['vega'] = (px[BumpGreeks.VOL_UP] - px[BumpGreeks.VOL_DOWN]) / (2 * dv)
+        result['rho'] = (px[BumpGreeks.RATE_UP] - px[BumpGreeks.RATE_DOWN]) / (2 * dr)
+        return result.reshape(shape)
+
+
+def _test():
+    import time
+    from binomial_model import BinomialTreeModel
+    from finite_difference_model import FiniteDifferenceModel
+    from monte_carlo_model import MonteCarloModel
+
+    pricing_date = datetime.date(2023, 12, 8)
+    r = 0.05
+    bs_model = BlackScholesModel(pricing_date, r)
+    stock = Stock(None, None, 'AAPL', spot_price = 100, sigma = 0.25, dividend_yield = 0.01)
+    options = [EuropeanCallOption(stock, 0.5, k) for k in (90, 100, 110)] + \
+              [EuropeanPutOption(stock, 1.0, k) for k in (90, 100, 110)]
+
+    analytic = bs_model.calc_price_and_greeks(options)
+    bumped = BumpGreeks(bs_model)
+    start = time.time()
+    greeks = bumped.calc_price_and_greeks(options)
+    print(f"B\\S bump and reprice in {(time.time() - start) * 1000:.2f} ms, {bumped.num_calls} call(s), "
+          f"{bumped.num_prices} prices")
+    for field in ('delta', 'gamma', 'theta', 'vega', 'rho'):
+        print(f"  max {field} error vs analytic: {np.abs(greeks[field] - analytic[field]).max():.2e}")
+
+    # American puts on the tree and the PDE grid
+    american = [AmericanPutOption(stock, 1.0, k) for k in (90, 100, 110)]
+    tree_greeks = BumpGreeks(BinomialTreeModel(pricing_date, r, num_steps = 1000)).calc_price_and_greeks(american)
+    fd_greeks = FiniteDifferenceModel(pricing_date, r).calc_price_and_greeks(american)
+    print('Tree delta:', tree_greeks['delta'], 'FD delta:', fd_greeks['delta'])
+    print('Tree vega:', tree_greeks['vega'], 'Tree rho:', tree_greeks['rho'])
+
+    # vols at or below the vol bump
+    low_vol = np.array([0.005, 0.01, 0.02])
+    print('Low vol vega:', bumped.calc_price_and_greeks(100.0, 100.0, 0.5, low_vol, 0.0, True)['vega'],
+          'B\\S:', bs_model.calc_price_and_greeks(100.0, 100.0, 0.5, low_vol, 0.0, True)['vega'])
+
+    # array inputs are European unless flagged, whatever the model default
+    tree_model = BumpGreeks(BinomialTreeModel(pricing_date, r, num_steps = 1000))
+    strikes = np.array([90.0, 100.0, 110.0])
+    print('Tree European put:', tree_model.calc_price_and_greeks(100.0, strikes, 1.0, 0.25, 0.01, False)['price'],
+          'B\\S:', bs_model.calc_model_price_batch(100.0, strikes, 1.0, 0.25, 0.01, False))
+    print('Tree American put:', tree_model.calc_price_and_greeks(100.0, strikes, 1.0, 0.25, 0.01, False,
+                                                                 is_american = True)['price'])
+
+    # Monte Carlo with common random numbers
+    mc_model = MonteCarloModel(pricing_date, r, num_paths = 200000, variance_reduction = MonteCarloModel.ANTITHETIC,
+                               seed = 42)
+    mc_greeks = BumpGreeks(mc_model).calc_price_and_greeks(options)
+    print('MC delta:', mc_greeks['delta'])
+    print('B\\S delta:', analytic['delta'])
+    print('MC vega:', mc_greeks['vega'])
+    print('B\\S vega:', analytic['vega'])
+
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,196 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Heston Model Calibration
+
+'''
+
+import time
+import datetime
+import numpy as np
+from scipy.optimize import least_squares
+from concurrent.futures import ProcessPoolExecutor
+
+from fft_model import FFTModel, HestonCharacteristicFunction
+
+
+class QuoteSet(object):
+    '''
+    option quotes of one underlying on one day, strike, time_to_expiry, is_call and market_price are arrays
+    '''
+    def __init__(self, spot, strike, time_to_expiry, is_call, market_price, dividend_yield = 0.0):
+        self.spot = spot
+        self.strike = np.asarray(strike, dtype = float)
+        self.time_to_expiry = np.asarray(time_to_expiry, dtype = float)
+        self.is_call = np.asarray(is_call, dtype = bool)
+        self.market_price = np.asarray(market_price, dtype = float)
+        self.dividend_yield = dividend_yield
+
+
+class CalibrationResult(object):
+    '''
+    fitted parameters with the fit quality and the wall time of every iteration
+    '''
+    def __init__(self, ticker, params, rmse, iterations, iteration_times, elapsed, success):
+        self.ticker = ticker
+        self.params = params
+        self.rmse = rmse
+        self.iterations = iterations
+        self.iteration_times = iteration_times
+        self.elapsed = elapsed
+        self.success = success
+
+    def __repr__(self):
+        params = ', '.join(f"{k}={v:.4f}" for k, v in zip(HestonCalibrator.PARAM_NAMES, self.params))
+        return (f"CalibrationResult({self.ticker}: {params}, rmse={self.rmse:.2e}, "
+                f"iterations={self.iterations}, elapsed={self.elapsed:.3f}s)")
+
+
+class HestonCalibrator(object):
+    '''
+    Least squares calibration of the Heston model to option prices through the FFT pricer
+
+    The objective prices the whole quote set in one batched transform (FFTModel.calc_quote_prices), and the
+    forward difference Jacobian stacks the base parameters with one bumped copy per parameter so all of it
+    is a single call as well. A fit starts from initial when given, so each day can warm start from the previous
+    day's parameters. calibrate_many fits independent underlyings in a process pool.
+    With verbose set, the wall time of every iteration is printed, it is always kept in the result
+    '''
+
+    PARAM_NAMES = ('v0', 'kappa', 'theta', 'sigma_v', 'rho')
+    LOWER = np.array([1e-4, 1e-3, 1e-4, 1e-2, -0.999])
+    UPPER = np.array([2.0, 20.0, 2.0, 5.0, 0.999])
+    DEFAULT_INITIAL = np.array([0.04, 1.5, 0.04, 0.5, -0.5])
+
+    def __init__(self, fft_model, bump = 1e-5, max_iter = 100, tol = 1e-10, verbose = False):
+        self.fft_model = fft_model
+        self.bump = bump
+        self.max_iter = max_iter
+        self.tol = tol
+        self.verbose = verbose
+
+    def model_prices(self, params, quotes):
+        '''
+        prices of every quote for a (P, 5) array of parameter sets, shape (P, num_quotes)
+        '''
+        params = np.atleast_2d(params)
+        char_func = HestonCharacteristicFunction(*[params[:, i, None, None] for i in range(params.shape[1])])
+        return self.fft_model.calc_quote_prices(quotes.spot, quotes.strike, quotes.time_to_expiry, char_func,
+                                                quotes.dividend_yield, quotes.is_call)
+
+    def calibrate(self, quotes, initial = None, ticker = None):
+        '''
+        fit the Heston parameters to a QuoteSet and return a CalibrationResult
+        '''
+        x0 = np.clip(HestonCalibrator.DEFAULT_INITIAL if initial is None else np.asarray(initial, dtype = float),
+                     HestonCalibrator.LOWER, HestonCalibrator.UPPER)
+        start = time.time()
+        iteration_times = []
+        last = [None]
+
+        def lap():
+            # an iteration runs from one Jacobian evaluation to the next, the first starts at the first Jacobian
+            now = time.time()
+            if last[0] is not None:
+                iteration_times.append(now - last[0])
+                if self.verbose:
+                    print(f"{ticker} iteration {len(iteration_times)}: {iteration_times[-1] * 1000:.1f} ms")
+            last[0] = now
+
+        def residuals(p):
+            return self.model_prices(p, quotes)[0] - quotes.market_price
+
+        def jacobian(p):
+            # the Jacobian is evaluated once per iteration, which is where the iteration time is taken
+            lap()
+            # step away from the nearest bound
+            h = self.bump * np.maximum(np.abs(p), 1e-2)
+            h = np.where(p + h > HestonCalibrator.UPPER, -h, h)
+            px = self.model_prices(np.vstack([p, p + np.diag(h)]), quotes)
+            return ((px[1:] - px[0]) / h[:, None]).T
+
+        fit = least_squares(residuals, x0, jac = jacobian, bounds = (HestonCalibrator.LOWER, HestonCalibrator.UPPER),
+                            method = 'trf', xtol = self.tol, ftol = self.tol, gtol = self.tol, max_nfev = self.max_iter)
+        lap()
+        rmse = float(np.sqrt(np.mean(fit.fun ** 2)))
+        return CalibrationResult(ticker, fit.x, rmse, fit.njev, np.array(iteration_times), time.time() - start,
+                                 fit.success)
+
+    def calibrate_history(self, daily_quotes, initial = None, ticker = None):
+        '''
+        fit a list of daily QuoteSets in order, each day warm starts from the previous fit
+        '''
+        results = []
+        for quotes in daily_quotes:
+            result = self.calibrate(quotes, initial, ticker)
+            initial = result.params
+            results.append(result)
+        return results
+
+    def calibrate_many(self, quotes_by_ticker, initial_by_ticker = None, num_workers = 1):
+        '''
+        fit a dict of ticker -> QuoteSet, spread across num_workers processes.
+        initial_by_ticker (e.g. the previous day's params) gives the warm starts
+        '''
+        initial_by_ticker = initial_by_ticker or {}
+        tasks = [(self, ticker, quotes, initial_by_ticker.get(ticker)) for ticker, quotes in quotes_by_ticker.items()]
+        if num_workers > 1:
+            with ProcessPoolExecutor(max_workers = num_workers) as executor:
+                results = list(executor.map(_calibrate_task, tasks))
+        else:
+            results = [_calibrate_task(task) for task in tasks]
+        return {result.ticker: result for result in results}
+
+
+def _calibrate_task(task):
+    calibrator, ticker, quotes, initial = task
+    return calibrator.calibrate(quotes, initial, ticker)
+
+
+def _test():
+    pricing_date = datetime.date(2023, 12, 8)
+    r = 0.05
+    fft_model = FFTModel(pricing_date, r)
+    calibrator = HestonCalibrator(fft_model)
+
+    # synthetic quotes from known parameters on two consecutive days
+    strikes = np.linspace(70, 130, 25)
+    expiries = np.array([1, 2, 3, 6, 9, 12, 24]) / 12
+    K, T = [x.ravel() for x in np.meshgrid(strikes, expiries)]
+    true_params = {'AAA': [0.04, 2.0, 0.05, 0.4, -0.7], 'BBB': [0.09, 1.0, 0.06, 0.8, -0.4],
+                   'CCC': [0.02, 3.0, 0.03, 0.3, -0.2], 'DDD': [0.06, 1.5, 0.08, 0.6, -0.8]}
+
+    def day_quotes(params, spot):
+        quotes = QuoteSet(spot, K * spot / 100, T, K > 100, np.zeros(K.shape[0]))
+        quotes.market_price = calibrator.model_prices(np.array(params), quotes)[0]
+        return quotes
+
+    day1 = {t: day_quotes(p, 100.0) for t, p in true_params.items()}
+    day2 = {t: day_quotes(np.array(p) * [1.05, 1, 1, 1.02, 1], 101.0) for t, p in true_params.items()}
+
+    start = time.time()
+    fits1 = calibrator.calibrate_many(day1, num_workers = 4)
+    print(f"Day 1, cold start, {time.time() - start:.2f}s")
+    for result in fits1.values():
+        print(' ', result, f"{result.iteration_times.mean() * 1000:.1f} ms/iteration")
+
+    start = time.time()
+    fits2 = calibrator.calibrate_many(day2, {t: r.params for t, r in fits1.items()}, num_workers = 4)
+    print(f"Day 2, warm start, {time.time() - start:.2f}s")
+    for result in fits2.values():
+        print(' ', result)
+
+    cold = HestonCalibrator(fft_model).calibrate(day2['AAA'], ticker = 'AAA')
+    print('Day 2 AAA from the default start:', cold.iterations, 'iterations')
+
+    verbose = HestonCalibrator(fft_model, verbose = True)
+    verbose.calibrate_history([day1['BBB'], day2['BBB']], ticker = 'BBB')
+
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,171 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Day Count Conventions and Trading Calendar
+
+'''
+
+import datetime
+import numpy as np
+
+
+ACT_365 = 'ACT/365'
+ACT_360 = 'ACT/360'
+BUS_252 = 'BUS/252'
+
+
+def nyse_holidays(start_year = 1990, end_year = 2060):
+    '''
+    NYSE full-day holidays between start_year and end_year as a datetime64[D] array,
+    weekend holidays are observed on the Friday before or the Monday after
+    '''
+    holidays = []
+    for year in range(start_year, end_year + 1):
+        jan1 = np.datetime64(f"{year}-01-01")
+        fixed = [jan1, np.datetime64(f"{year}-07-04"), np.datetime64(f"{year}-12-25")]
+        if year >= 2022:
+            fixed.append(np.datetime64(f"{year}-06-19"))
+        for day in fixed:
+            weekday = _weekday(day)
+            if weekday == 5:
+                # New Year's Day on a Saturday is not observed on the previous Dec 31
+                if day != jan1:
+                    holidays.append(day - 1)
+            elif weekday == 6:
+                holidays.append(day + 1)
+            else:
+                holidays.append(day)
+        if year >= 1998:
+            # Martin Luther King Jr. Day, the exchange first closed for it in 1998
+            holidays.append(np.busday_offset(f"{year}-01", 2, roll = 'forward', weekmask = 'Mon'))
+        holidays += [
+            np.busday_offset(f"{year}-02", 2, roll = 'forward', weekmask = 'Mon'),    # Washington's Birthday
+            _easter(year) - 2,                                                        # Good Friday
+            np.busday_offset(f"{year}-06", -1, roll = 'forward', weekmask = 'Mon'),   # Memorial Day
+            np.busday_offset(f"{year}-09", 0, roll = 'forward', weekmask = 'Mon'),    # Labor Day
+            np.busday_offset(f"{year}-11", 3, roll = 'forward', weekmask = 'Thu'),    # Thanksgiving
+        ]
+    return np.unique(np.array(holidays, dtype = 'datetime64[D]'))
+
+def _weekday(day):
+    # 0 is Monday
+    return int((day.astype('datetime64[D]').astype(np.int64) - 4) % 7)
+
+def _easter(year):
+    # Gregorian Easter Sunday (anonymous Gregorian algorithm)
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return np.datetime64(f"{year}-{month:02d}-{day:02d}")
+
+
+class TradingCalendar(object):
+    '''
+    Business days with a precomputed holiday table (NYSE by default), backed by a numpy busdaycalendar
+    so counting business days between millions of date pairs is one vectorized call
+    '''
+
+    def __init__(self, holidays = None):
+        self.holidays = nyse_holidays() if holidays is None else np.asarray(holidays, dtype = 'datetime64[D]')
+        self.busdaycal = np.busdaycalendar(holidays = self.holidays)
+
+    def is_business_day(self, dates):
+        return np.is_busday(to_datetime64(dates), busdaycal = self.busdaycal)
+
+    def business_days(self, start, end):
+        # business days in [start, end), negative when end is before start
+        return np.busday_count(to_datetime64(start), to_datetime64(end), busdaycal = self.busdaycal)
+
+    def add_business_days(self, dates, offsets):
+        return np.busday_offset(to_datetime64(dates), offsets, roll = 'forward', busdaycal = self.busdaycal)
+
+
+_default_calendar = None
+
+def default_calendar():
+    # the NYSE calendar, built on first use
+    global _default_calendar
+    if _default_calendar is None:
+        _default_calendar = TradingCalendar()
+    return _default_calendar
+
+
+def to_datetime64(dates):
+    '''
+    convert a date, a datetime, a YYYY-MM-DD string or any array of them to datetime64[D]
+    '''
+    if isinstance(dates, datetime.datetime):
+        dates = dates.date()
+    if isinstance(dates, np.ndarray) and np.issubdtype(dates.dtype, np.datetime64):
+        return dates.astype('datetime64[D]')
+    if isinstance(dates, (list, tuple)):
+        dates = np.asarray(dates)
+    if isinstance(dates, np.ndarray):
+        if dates.dtype.kind in 'US':
+            # strings are cut to YYYY-MM-DD and parsed by numpy in one pass
+            return dates.astype('U10').astype('datetime64[D]')
+        # datetime objects would convert at their own resolution, so only those are reduced to dates one by one
+        values = [x.date() if isinstance(x, datetime.datetime) else x for x in dates.ravel()]
+        return np.array(values, dtype = 'datetime64[D]').reshape(dates.shape)
+    if isinstance(dates, str):
+        dates = dates[:10]
+    return np.datetime64(dates, 'D')
+
+
+def year_fraction(start, end, convention = ACT_365, calendar = None):
+    '''
+    year fractions from start to end dates (scalars or arrays that broadcast together)
+
+    ACT/365 and ACT/360 divide the calendar days, BUS/252 divides the business days of calendar
+    (the NYSE calendar by default) by 252
+    '''
+    start, end = to_datetime64(start), to_datetime64(end)
+    if convention == ACT_365:
+        return (end - start).astype(np.int64) / 365.0
+    elif convention == ACT_360:
+        return (end - start).astype(np.int64) / 360.0
+    elif convention == BUS_252:
+        calendar = default_calendar() if calendar is None else calendar
+        return calendar.business_days(start, end) / 252.0
+    raise Exception(f"Unsupported day count convention {convention}")
+
+
+def _test():
+    import time
+    from blackscholes_model import BlackScholesModel
+
+    calendar = default_calendar()
+    print('2023 holidays:', calendar.holidays[(calendar.holidays >= np.datetime64('2023-01-01')) &
+                                              (calendar.holidays <= np.datetime64('2023-12-31'))])
+    print('Business days in 2023:', calendar.business_days('2023-01-01', '2024-01-01'))
+    print('MLK Day closed in 1997, 1998:', (~calendar.is_business_day(['1997-01-20', '1998-01-19'])).tolist())
+
+    pricing_date = datetime.date(2023, 12, 8)
+    bs_model = BlackScholesModel(pricing_date, 0.05)
+    expiries = ['2023-12-15', '2024-01-19', '2024-06-21', '2025-12-19']
+    for convention in (ACT_365, ACT_360, BUS_252):
+        print(convention, bs_model.calc_time_to_expiry(expiries, convention))
+
+    # a few million expiries in one call
+    rng = np.random.default_rng(0)
+    n = 5000000
+    many = np.datetime64('2023-12-08') + rng.integers(1, 1000, n)
+    for convention in (ACT_365, BUS_252):
+        start = time.time()
+        year_fraction(pricing_date, many, convention)
+        print(f"{convention}: {n} year fractions in {time.time() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    _test()
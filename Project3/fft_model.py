@@ -0,0 +1,183 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Carr-Madan FFT Model
+
+'''
+
+import datetime
+import numpy as np
+from scipy.interpolate import CubicSpline
+
+from stock import Stock
+from financial_option import *
+from blackscholes_model import BlackScholesModel, option_arrays
+
+
+class CharacteristicFunction(object):
+    '''
+    Risk-neutral characteristic function of log(S_T)
+
+    Subclasses implement __call__(u, S0, T, r, q) for a 1-d array of complex u.
+    Model parameters may be arrays with a trailing axis of length 1, the result then broadcasts
+    to (..., len(u)) and the FFT model prices every parameter set at once
+    '''
+    def __call__(self, u, S0, T, r, q):
+        raise NotImplementedError
+
+
+class BlackScholesCharacteristicFunction(CharacteristicFunction):
+    def __init__(self, sigma):
+        self.sigma = np.asarray(sigma, dtype = float)
+
+    def __call__(self, u, S0, T, r, q):
+        sigma = self.sigma
+        mu = np.log(S0) + (r - q - sigma ** 2 / 2) * T
+        return np.exp(1j * u * mu - sigma ** 2 * u ** 2 * T / 2)
+
+
+class HestonCharacteristicFunction(CharacteristicFunction):
+    '''
+    Heston stochastic volatility: initial variance v0, mean reversion speed kappa to the long run variance theta,
+    volatility of variance sigma_v and spot/variance correlation rho. Uses the formulation of Albrecher et al.
+    which avoids the branch cut of the complex logarithm
+    '''
+    def __init__(self, v0, kappa, theta, sigma_v, rho):
+        self.v0, self.kappa, self.theta, self.sigma_v, self.rho = [np.asarray(x, dtype = float) for x in
+                                                                   (v0, kappa, theta, sigma_v, rho)]
+
+    def __call__(self, u, S0, T, r, q):
+        v0, kappa, theta, sigma_v, rho = self.v0, self.kappa, self.theta, self.sigma_v, self.rho
+        beta = kappa - rho * sigma_v * 1j * u
+        d = np.sqrt(beta ** 2 + sigma_v ** 2 * (1j * u + u ** 2))
+        g = (beta - d) / (beta + d)
+        exp_dT = np.exp(-d * T)
+        C = kappa * theta / sigma_v ** 2 * ((beta - d) * T - 2 * np.log((1 - g * exp_dT) / (1 - g)))
+        D = (beta - d) / sigma_v ** 2 * (1 - exp_dT) / (1 - g * exp_dT)
+        return np.exp(1j * u * (np.log(S0) + (r - q) * T) + C + D * v0)
+
+
+class FFTModel(object):
+    '''
+    Carr-Madan pricer: one FFT of the damped call transform gives call prices on num_points log-strikes,
+    which are then interpolated onto the requested strikes with a cubic spline.
+    eta is the spacing of the integration grid and alpha the damping factor.
+    Puts come from put-call parity
+    '''
+
+    def __init__(self, pricing_date, risk_free_rate, num_points = 4096, eta = 0.25, alpha = 1.5):
+        self.pricing_date = pricing_date
+        self.risk_free_rate = risk_free_rate
+        self.num_points = num_points
+        self.eta = eta
+        self.alpha = alpha
+
+    def calc_strike_strip(self, spot, strikes, time_to_expiry, char_func, dividend_yield = 0.0, is_call = True):
+        '''
+        Price a strip of strikes of a single expiry
+
+        char_func is a CharacteristicFunction, is_call a scalar or an array matching strikes.
+        Returns an array of prices shaped (..., len(strikes)), the leading axes are those of the char_func parameters
+        '''
+        S0, T, q, r = spot, time_to_expiry, dividend_yield, self.risk_free_rate
+        strikes = np.asarray(strikes, dtype = float)
+        log_strikes, calls = self._call_grid(char_func, S0, T, r, q)
+
+        spline = CubicSpline(log_strikes, calls, axis = -1)
+        px = spline(np.log(strikes))
+        # put-call parity for the puts
+        parity = S0 * np.exp(-q * T) - strikes * np.exp(-r * T)
+        return np.where(is_call, px, px - parity)
+
+    def calc_model_price_batch(self, options):
+        '''
+        Price a list of European FinancialOption objects (or an OptionBook) with Black-Scholes dynamics,
+        one FFT per underlying and expiry
+        '''
+        arrays = option_arrays(options)
+        if arrays.is_american.any():
+            raise Exception("FFT price for American option not implemented yet")
+
+        px = np.empty(arrays.strike.shape[0])
+        keys = np.column_stack([arrays.spot, arrays.sigma, arrays.dividend_yield, arrays.time_to_expiry])
+        strips, group = np.unique(keys, axis = 0, return_inverse = True)
+        group = group.ravel()
+        for g, (S0, sigma, q, T) in enumerate(strips):
+            idx = np.flatnonzero(group == g)
+            px[idx] = self.calc_strike_strip(S0, arrays.strike[idx], T, BlackScholesCharacteristicFunction(sigma), q,
+                                             arrays.is_call[idx])
+        return px
+
+    def calc_quote_prices(self, spot, strikes, expiries, char_func, dividend_yield = 0.0, is_call = True):
+        '''
+        Price a whole quote set of one underlying across all its expiries with one batched transform
+
+        strikes, expiries and is_call are arrays with one entry per quote. The char_func parameters may carry
+        leading axes followed by two axes of length 1, e.g. (P, 1, 1) for P parameter sets priced at once.
+        Returns prices shaped (..., len(strikes))
+        '''
+        S0, q, r = spot, dividend_yield, self.risk_free_rate
+        strikes = np.asarray(strikes, dtype = float)
+        expiries = np.asarray(expiries, dtype = float)
+        slices, slice_idx = np.unique(expiries, return_inverse = True)
+        log_strikes, calls = self._call_grid(char_func, S0, slices[:, None], r, q)
+
+        # (..., expiry, strike) on every quote strike, then each quote picks its own expiry
+        px = CubicSpline(log_strikes, calls, axis = -1)(np.log(strikes))
+        px = px[..., slice_idx.ravel(), np.arange(strikes.shape[0])]
+        parity = S0 * np.exp(-q * expiries) - strikes * np.exp(-r * expiries)
+        return np.where(is_call, px, px - parity)
+
+    def _call_grid(self, char_func, S0, T, r, q):
+        # call prices on the FFT log-strike grid, centred on log(S0)
+        N, eta, alpha = self.num_points, self.eta, self.alpha
+        lam = 2 * np.pi / (N * eta)
+        b = N * lam / 2
+        j = np.arange(N)
+        v = eta * j
+        log_strikes = np.log(S0) - b + lam * j
+
+        phi = char_func(v - (alpha + 1) * 1j, S0, T, r, q)
+        psi = np.exp(-r * T) * phi / (alpha ** 2 + alpha - v ** 2 + 1j * (2 * alpha + 1) * v)
+        # Simpson weights
+        weights = eta / 3 * (3 + (-1.0) ** (j + 1))
+        weights[0] -= eta / 3
+        x = np.exp(1j * (b - np.log(S0)) * v) * psi * weights
+        calls = np.exp(-alpha * log_strikes) / np.pi * np.fft.fft(x, axis = -1).real
+        return log_strikes, calls
+
+
+def _test():
+    import time
+
+    pricing_date = datetime.date(2023, 12, 8)
+    r = 0.05
+    stock = Stock(None, None, 'AAPL', spot_price = 100, sigma = 0.25, dividend_yield = 0.01)
+    bs_model = BlackScholesModel(pricing_date, r)
+    fft_model = FFTModel(pricing_date, r)
+
+    strikes = np.linspace(50, 150, 401)
+    start = time.time()
+    calls = fft_model.calc_strike_strip(100, strikes, 0.5, BlackScholesCharacteristicFunction(0.25), 0.01, True)
+    print(f"{len(strikes)} strikes in {(time.time() - start) * 1000:.2f} ms")
+    closed_form = bs_model.calc_model_price_batch(100, strikes, 0.5, 0.25, 0.01, True)
+    print('Max call error vs B\\S:', np.abs(calls - closed_form).max())
+
+    chain = [EuropeanCallOption(stock, 0.5, k) for k in range(80, 125, 5)] + \
+            [EuropeanPutOption(stock, 1.0, k) for k in range(80, 125, 5)]
+    print('Max chain error vs B\\S:',
+          np.abs(fft_model.calc_model_price_batch(chain) - bs_model.calc_model_price_batch(chain)).max())
+
+    # several parameter sets priced in one transform
+    sigmas = np.array([0.1, 0.2, 0.3])[:, None]
+    print('Vol strip at K=100:', fft_model.calc_strike_strip(100, [100.0], 0.5,
+                                                             BlackScholesCharacteristicFunction(sigmas), 0.01)[:, 0])
+
+
+if __name__ == "__main__":
+    _test()
@@ -10,7 +10,6 @@ A Simple Option Class
 
 '''
 import enum
-import calendar
 import math
 import pandas as pd
 import numpy as np
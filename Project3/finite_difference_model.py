@@ -0,0 +1,212 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Crank-Nicolson Finite Difference Model
+
+'''
+
+import datetime
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from stock import Stock
+from financial_option import *
+from blackscholes_model import BlackScholesModel, option_arrays
+
+
+# record layout returned by FiniteDifferenceModel.calc_price_and_greeks
+FD_GREEKS_DTYPE = np.dtype([('price', 'f8'), ('delta', 'f8'), ('gamma', 'f8'), ('theta', 'f8')])
+
+
+class FiniteDifferenceModel(object):
+    '''
+    Crank-Nicolson scheme for the Black-Scholes PDE on a log-spot grid, for European and American options
+
+    The grid is centred on log(spot) and spans num_std standard deviations (widened to cover the strikes).
+    Options with the same spot, sigma, dividend_yield, rate and expiry share one grid: the tridiagonal system is
+    factorised once with splu and reused for every time step and every option on the grid (one column each).
+    The first rannacher_steps steps are replaced by fully implicit half steps to damp the payoff kink.
+    Early exercise is handled with projected SOR in red-black order, started from the projected direct solve.
+    Delta, gamma and theta are read off the last two time levels of the grid
+    '''
+
+    def __init__(self, pricing_date, risk_free_rate, num_space_steps = 400, num_time_steps = 200, num_std = 5.0,
+                 rannacher_steps = 2, omega = 1.2, tol = 1e-10, max_iter = 500):
+        self.pricing_date = pricing_date
+        self.risk_free_rate = risk_free_rate
+        # an even number of steps keeps the spot on the middle node
+        self.num_space_steps = num_space_steps + num_space_steps % 2
+        self.num_time_steps = num_time_steps
+        self.num_std = num_std
+        self.rannacher_steps = rannacher_steps
+        self.omega = omega
+        self.tol = tol
+        self.max_iter = max_iter
+
+    def calc_model_price(self, option):
+        return(float(self.calc_price_and_greeks(option)['price']))
+
+    def calc_model_price_batch(self, spot, strike = None, time_to_expiry = None, sigma = None,
+                               dividend_yield = 0.0, is_call = True, risk_free_rate = None, is_american = False):
+        # flat array of prices, same inputs as calc_price_and_greeks
+        return(self.calc_price_and_greeks(spot, strike, time_to_expiry, sigma, dividend_yield, is_call, risk_free_rate,
+                                          is_american)['price'])
+
+    def calc_price_and_greeks(self, spot, strike = None, time_to_expiry = None, sigma = None,
+                              dividend_yield = 0.0, is_call = True, risk_free_rate = None, is_american = False):
+        '''
+        Price, delta, gamma and theta from the final grid
+
+        Inputs follow BinomialTreeModel.calc_model_price_batch, spot can also be a single FinancialOption
+        or a list of them. Returns a FD_GREEKS_DTYPE structured array (a single record for a single option)
+        '''
+        if isinstance(spot, FinancialOption):
+            return(self.calc_price_and_greeks([spot])[0])
+        if strike is None:
+            arrays = option_arrays(spot)
+            spot, strike, time_to_expiry = arrays.spot, arrays.strike, arrays.time_to_expiry
+            sigma, dividend_yield = arrays.sigma, arrays.dividend_yield
+            is_call, is_american = arrays.is_call, arrays.is_american
+
+        r = self.risk_free_rate if risk_free_rate is None else risk_free_rate
+        S0, K, T, sigma, q, r, is_call, is_american = [np.ravel(x) for x in np.broadcast_arrays(
+            *[np.asarray(x, dtype = float) for x in (spot, strike, time_to_expiry, sigma, dividend_yield, r,
+                                                     is_call, is_american)])]
+        is_call = is_call.astype(bool)
+        is_american = is_american.astype(bool)
+
+        result = np.empty(S0.shape[0], dtype = FD_GREEKS_DTYPE)
+        # one grid per distinct (spot, sigma, dividend_yield, rate, expiry, exercise style)
+        keys = np.column_stack([S0, sigma, q, r, T, is_american])
+        _, group = np.unique(keys, axis = 0, return_inverse = True)
+        for g in range(group.max() + 1):
+            idx = np.flatnonzero(group.ravel() == g)
+            i = idx[0]
+            result[idx] = self._solve_grid(S0[i], sigma[i], q[i], r[i], T[i], bool(is_american[i]),
+                                           K[idx], is_call[idx])
+        return(result)
+
+    def _solve_grid(self, S0, sigma, q, r, T, american, K, is_call):
+        '''
+        march one grid from expiry back to today, K and is_call hold one entry per option column
+        '''
+        M, N = self.num_space_steps, self.num_time_steps
+        half_width = max(self.num_std * sigma * np.sqrt(T), 1.5 * np.abs(np.log(K / S0)).max())
+        dx = 2 * half_width / M
+        x = np.log(S0) + dx * (np.arange(M + 1) - M // 2)
+        S = np.exp(x)[:, None]
+        dt = T / N
+
+        sign = np.where(is_call, 1.0, -1.0)
+        payoff = np.maximum(sign * (S - K), 0.0)
+
+        # V_tau = a V_xx + b V_x - r V as a tridiagonal stencil (lower, diag, upper)
+        a = sigma ** 2 / (2 * dx ** 2)
+        b = (r - q - sigma ** 2 / 2) / (2 * dx)
+        lower, diag, upper = a - b, -2 * a - r, a + b
+
+        def boundary(tau):
+            # Dirichlet values at the two ends of the grid for every column
+            if american:
+                return np.maximum(sign * (S[[0, -1]] - K), 0.0)
+            return np.maximum(sign * (S[[0, -1]] * np.exp(-q * tau) - K * np.exp(-r * tau)), 0.0)
+
+        def factorise(theta_dt):
+            # interior matrix of (I - theta_dt L)
+            A = sparse.diags([np.full(M - 2, -theta_dt * lower), np.full(M - 1, 1 - theta_dt * diag),
+                              np.full(M - 2, -theta_dt * upper)], [-1, 0, 1], format = 'csc')
+            return splu(A), (-theta_dt * lower, 1 - theta_dt * diag, -theta_dt * upper)
+
+        # fully implicit half steps first, then Crank-Nicolson
+        rannacher = min(self.rannacher_steps, N)
+        steps = [(dt / 2, 1.0)] * (2 * rannacher) + [(dt, 0.5)] * (N - rannacher)
+        systems = {}
+
+        V = payoff.copy()
+        previous = V
+        tau = 0.0
+        for step, theta in steps:
+            if (step, theta) not in systems:
+                systems[(step, theta)] = factorise(theta * step)
+            lu, coefficients = systems[(step, theta)]
+            explicit = (1 - theta) * step
+
+            tau += step
+            edge = boundary(tau)
+            rhs = V[1:-1] + explicit * (lower * V[:-2] + diag * V[1:-1] + upper * V[2:])
+            direct = rhs.copy()
+            direct[0] -= coefficients[0] * edge[0]
+            direct[-1] -= coefficients[2] * edge[1]
+
+            previous = V
+            V = np.empty_like(V)
+            V[0], V[-1] = edge[0], edge[1]
+            V[1:-1] = lu.solve(direct)
+            if american:
+                self._psor(V, rhs, coefficients, payoff)
+
+        # read the Greeks off the middle node, d/dS from d/dx on the log grid
+        j = M // 2
+        V_x = (V[j + 1] - V[j - 1]) / (2 * dx)
+        V_xx = (V[j + 1] - 2 * V[j] + V[j - 1]) / dx ** 2
+        result = np.empty(K.shape[0], dtype = FD_GREEKS_DTYPE)
+        result['price'] = V[j]
+        result['delta'] = V_x / S0
+        result['gamma'] = (V_xx - V_x) / S0 ** 2
+        result['theta'] = -(V[j] - previous[j]) / steps[-1][0]
+        return(result)
+
+    def _psor(self, V, rhs, coefficients, payoff):
+        '''
+        projected SOR on the interior nodes, the even and odd nodes are each updated in one vectorized sweep
+        '''
+        lower, diag, upper = coefficients
+        np.maximum(V, payoff, out = V)
+        for _ in range(self.max_iter):
+            change = 0.0
+            for start in (1, 2):
+                j = slice(start, V.shape[0] - 1, 2)
+                jm = slice(start - 1, V.shape[0] - 2, 2)
+                jp = slice(start + 1, V.shape[0], 2)
+                gauss_seidel = (rhs[start - 1::2] - lower * V[jm] - upper * V[jp]) / diag
+                updated = np.maximum(V[j] + self.omega * (gauss_seidel - V[j]), payoff[j])
+                change = max(change, np.abs(updated - V[j]).max())
+                V[j] = updated
+            if change < self.tol:
+                break
+
+
+def _test():
+    import time
+
+    pricing_date = datetime.date(2023, 12, 8)
+    r = 0.1
+    stock = Stock(None, None, 'AAPL', spot_price = 50, sigma = 0.4)
+    bs_model = BlackScholesModel(pricing_date, r)
+    fd_model = FiniteDifferenceModel(pricing_date, r)
+
+    european_put = EuropeanPutOption(stock, time_to_expiry = 5 / 12, strike = 50)
+    american_put = AmericanPutOption(stock, time_to_expiry = 5 / 12, strike = 50)
+    print('B\\S European Put:', bs_model.calc_price_and_greeks(european_put))
+    print('C-N European Put:', fd_model.calc_price_and_greeks(european_put))
+    print('C-N American Put:', fd_model.calc_price_and_greeks(american_put))
+
+    # a strike strip shares one grid and one factorisation
+    strikes = np.arange(30, 71, 1.0)
+    start = time.time()
+    strip = fd_model.calc_price_and_greeks(50.0, strikes, 5 / 12, 0.4, 0.0, False, is_american = True)
+    print(f"{len(strikes)} American puts in {time.time() - start:.3f} seconds")
+    european = fd_model.calc_price_and_greeks(50.0, strikes, 5 / 12, 0.4, 0.0, False, is_american = False)
+    closed_form = bs_model.calc_price_and_greeks(50.0, strikes, 5 / 12, 0.4, 0.0, False)
+    print('Max European price error:', np.abs(european['price'] - closed_form['price']).max())
+    print('Max European gamma error:', np.abs(european['gamma'] - closed_form['gamma']).max())
+
+
+if __name__ == "__main__":
+    _test()
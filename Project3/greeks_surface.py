@@ -0,0 +1,163 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Price and Greeks surfaces over spot x vol x time grids
+
+'''
+
+import datetime
+import numpy as np
+
+from stock import Stock
+from financial_option import *
+from blackscholes_model import BlackScholesModel, GREEKS_DTYPE
+
+
+class GreeksSurface(object):
+    '''
+    Labelled price and Greeks grid
+
+    values is a GREEKS_DTYPE structured array with dims (option, spot_bump, vol_bump, time_decay)
+    and coords maps each dim to its labels. surface['delta'] returns the delta grid
+    '''
+
+    dims = ('option', 'spot_bump', 'vol_bump', 'time_decay')
+
+    def __init__(self, values, coords):
+        self.values = values
+        self.coords = coords
+
+    def __getitem__(self, field):
+        return self.values[field]
+
+    def sel(self, field, **labels):
+        '''
+        select a field at the given labels, e.g. surface.sel('price', spot_bump = 0.0, time_decay = 0.0)
+        '''
+        index = []
+        for dim in GreeksSurface.dims:
+            if dim in labels:
+                index.append(int(np.flatnonzero(np.isclose(self.coords[dim], labels[dim]))[0]))
+            else:
+                index.append(slice(None))
+        return self.values[field][tuple(index)]
+
+
+class GreeksSurfaceGenerator(object):
+    '''
+    Compute price and Greeks of a set of options over a spot x vol x time grid with NumPy broadcasting
+
+    spot_bumps are relative moves of the spot (0.05 is +5%), vol_bumps are added to sigma and
+    time_decay is the time elapsed in years, grid points at or past expiry are nan.
+    Options are processed in chunks so the intermediate arrays stay within max_bytes
+    '''
+
+    # rough number of float64 temporaries the fused kernel keeps alive per grid point
+    _bytes_per_point = 24 * 8
+
+    def __init__(self, model, spot_bumps, vol_bumps, time_decay, max_bytes = 256 * 1024 ** 2):
+        self.model = model
+        self.spot_bumps = np.asarray(spot_bumps, dtype = float)
+        self.vol_bumps = np.asarray(vol_bumps, dtype = float)
+        self.time_decay = np.asarray(time_decay, dtype = float)
+        self.max_bytes = max_bytes
+
+    @property
+    def grid_shape(self):
+        return (self.spot_bumps.shape[0], self.vol_bumps.shape[0], self.time_decay.shape[0])
+
+    @property
+    def chunk_size(self):
+        # number of options whose full grid fits in the memory budget
+        points = int(np.prod(self.grid_shape))
+        return max(1, self.max_bytes // (points * GreeksSurfaceGenerator._bytes_per_point))
+
+    def iter_chunks(self, spot, strike = None, time_to_expiry = None, sigma = None, dividend_yield = 0.0,
+                    is_call = True):
+        '''
+        yield (option_slice, GreeksSurface) per chunk of options
+
+        Inputs follow BlackScholesModel.calc_model_price_batch, spot can be a list of FinancialOption objects
+        '''
+        inputs = self._flat_inputs(spot, strike, time_to_expiry, sigma, dividend_yield, is_call)
+        return self._iter_chunks(inputs)
+
+    def calc_surface(self, spot, strike = None, time_to_expiry = None, sigma = None, dividend_yield = 0.0,
+                     is_call = True, out = None):
+        '''
+        compute the whole grid and return a GreeksSurface
+
+        out can be a preallocated GREEKS_DTYPE array of shape (n_options,) + grid_shape, e.g. an np.memmap
+        when the full surface itself does not fit in memory
+        '''
+        inputs = self._flat_inputs(spot, strike, time_to_expiry, sigma, dividend_yield, is_call)
+        n = inputs[0].shape[0]
+        result = np.empty((n,) + self.grid_shape, dtype = GREEKS_DTYPE) if out is None else out
+        for chunk, surface in self._iter_chunks(inputs):
+            result[chunk] = surface.values
+        return GreeksSurface(result, self._coords(slice(0, n)))
+
+    def _flat_inputs(self, spot, strike, time_to_expiry, sigma, dividend_yield, is_call):
+        inputs = self.model._batch_inputs(spot, strike, time_to_expiry, sigma, dividend_yield, is_call, None)
+        return [np.ravel(x) for x in inputs]
+
+    def _coords(self, chunk):
+        return {'option': np.arange(chunk.start, chunk.stop), 'spot_bump': self.spot_bumps,
+                'vol_bump': self.vol_bumps, 'time_decay': self.time_decay}
+
+    def _iter_chunks(self, inputs):
+        S0, K, T, sigma, q, is_call, r = inputs
+        n = S0.shape[0]
+
+        # bump axes, each one along its own dimension of the (option, spot, vol, time) grid
+        spot_factor = (1 + self.spot_bumps)[None, :, None, None]
+        vol_bump = self.vol_bumps[None, None, :, None]
+        decay = self.time_decay[None, None, None, :]
+
+        for start in range(0, n, self.chunk_size):
+            chunk = slice(start, min(start + self.chunk_size, n))
+            col = lambda x: x[chunk, None, None, None]
+
+            remaining = col(T) - decay
+            remaining = np.where(remaining > 0, remaining, np.nan)
+            values = self.model.calc_price_and_greeks(col(S0) * spot_factor, col(K), remaining,
+                                                      col(sigma) + vol_bump, col(q), col(is_call), col(r))
+            yield chunk, GreeksSurface(values, self._coords(chunk))
+
+
+def _test():
+    import time
+
+    pricing_date = datetime.date(2023, 12, 8)
+    bs_model = BlackScholesModel(pricing_date, 0.05)
+    stock = Stock(None, None, 'AAPL', spot_price = 42, sigma = 0.2)
+    chain = [EuropeanCallOption(stock, 0.5, k) for k in range(30, 55)] + \
+            [EuropeanPutOption(stock, 0.5, k) for k in range(30, 55)]
+
+    generator = GreeksSurfaceGenerator(bs_model, spot_bumps = np.linspace(-0.2, 0.2, 41),
+                                       vol_bumps = np.linspace(-0.1, 0.1, 21), time_decay = [0.0, 1 / 12, 0.25])
+    surface = generator.calc_surface(chain)
+    print('Delta grid shape:', surface['delta'].shape)
+    print('Base price check:', surface.sel('price', option = 0, spot_bump = 0.0, vol_bump = 0.0, time_decay = 0.0),
+          bs_model.calc_model_price(chain[0]))
+
+    # 500 options over a 50 x 50 x 20 grid within a 256MB working budget
+    n = 500
+    rng = np.random.default_rng(0)
+    generator = GreeksSurfaceGenerator(bs_model, np.linspace(-0.25, 0.25, 50), np.linspace(-0.1, 0.1, 50),
+                                       np.linspace(0, 0.2, 20))
+    start = time.time()
+    net_delta = 0.0
+    for chunk, surface in generator.iter_chunks(rng.uniform(50, 150, n), 100.0, rng.uniform(0.25, 2.0, n),
+                                                rng.uniform(0.1, 0.5, n), 0.0, rng.random(n) < 0.5):
+        net_delta = net_delta + surface['delta'].sum(axis = 0)
+    print(f"{n} options in chunks of {generator.chunk_size} took {time.time() - start:.3f} seconds")
+
+
+if __name__ == "__main__":
+    _test()
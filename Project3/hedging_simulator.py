@@ -0,0 +1,138 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Delta Hedging Simulator
+
+'''
+
+import datetime
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from financial_option import *
+from blackscholes_model import BlackScholesModel
+
+
+def simulate_gbm_paths(S0, mu, sigma, T, num_steps, num_paths, dividend_yield = 0.0, seed = None):
+    '''
+    (num_paths, num_steps + 1) GBM spot paths with drift mu and volatility sigma, starting at S0
+    '''
+    rng = np.random.default_rng(seed)
+    dt = T / num_steps
+    Z = rng.standard_normal((num_paths, num_steps))
+    paths = np.empty((num_paths, num_steps + 1))
+    paths[:, 0] = 0.0
+    np.cumsum((mu - dividend_yield - sigma ** 2 / 2) * dt + sigma * np.sqrt(dt) * Z, axis = 1, out = paths[:, 1:])
+    return S0 * np.exp(paths)
+
+def historical_paths(stock, start_date, end_date, num_steps, stride = 1, S0 = None):
+    '''
+    overlapping windows of num_steps + 1 daily closes from EquityDailyPrice, each rescaled to start at S0
+    (the stock spot_price by default), one window every stride days
+    '''
+    df = stock.get_daily_hist_price(start_date, end_date)
+    close = df['Close'].values.astype(float)
+    windows = sliding_window_view(close, num_steps + 1)[::stride]
+    S0 = stock.spot_price if S0 is None else S0
+    return S0 * windows / windows[:, :1]
+
+
+class HedgeResult(object):
+    '''
+    pnl is (len(rebalance_every), num_paths), the present value of the hedged short option position per path
+    '''
+    def __init__(self, rebalance_every, pnl, premium):
+        self.rebalance_every = rebalance_every
+        self.pnl = pnl
+        self.premium = premium
+
+    def summary(self, var_level = 0.05):
+        return pd.DataFrame({'rebalance_every': self.rebalance_every,
+                             'mean': self.pnl.mean(axis = 1),
+                             'std': self.pnl.std(axis = 1),
+                             'std_to_premium': self.pnl.std(axis = 1) / self.premium,
+                             f"var_{int(var_level * 100)}": -np.quantile(self.pnl, var_level, axis = 1),
+                             'worst': self.pnl.min(axis = 1)})
+
+
+class DeltaHedgeSimulator(object):
+    '''
+    Replay a short option position hedged with Black-Scholes deltas over many spot paths at once
+
+    The deltas at every node of every path come from one batch Greeks call, each rebalance schedule then
+    just picks which of them is held on each step, so all paths and schedules are evaluated without a Python loop
+    over days or paths. The option is sold at the model price, the cash account earns the model risk_free_rate
+    and the shares earn the dividend_yield. transaction_cost is charged as a fraction of the traded notional
+    '''
+
+    def __init__(self, model, transaction_cost = 0.0):
+        self.model = model
+        self.transaction_cost = transaction_cost
+
+    def run(self, paths, strike, time_to_expiry, sigma, is_call = True, dividend_yield = 0.0, rebalance_every = (1,)):
+        '''
+        paths is (num_paths, num_steps + 1) spanning time_to_expiry, sigma is the volatility used for hedging.
+        rebalance_every lists the schedules in steps between rebalances. Returns a HedgeResult
+        '''
+        paths = np.asarray(paths, dtype = float)
+        num_paths, N = paths.shape[0], paths.shape[1] - 1
+        K, T, q, r = strike, time_to_expiry, dividend_yield, self.model.risk_free_rate
+        dt = T / N
+        t = dt * np.arange(N + 1)
+
+        # deltas at every rebalance node, one batch call for all paths
+        greeks = self.model.calc_price_and_greeks(paths[:, :-1], K, T - t[:-1], sigma, q, is_call)
+        delta = greeks['delta']
+        premium = float(greeks['price'][0, 0])
+
+        # discounted gain of one share held over each step, dividends are paid into the cash account
+        disc = np.exp(-r * t)
+        gain = disc[1:] * (paths[:, 1:] + q * dt * paths[:, :-1]) - disc[:-1] * paths[:, :-1]
+        payoff = np.maximum((1.0 if is_call else -1.0) * (paths[:, -1] - K), 0.0)
+
+        # held delta per schedule and step, delta is refreshed every f steps
+        rebalance_every = np.asarray(rebalance_every)
+        steps = np.arange(N)
+        held = delta[:, (steps[None, :] // rebalance_every[:, None]) * rebalance_every[:, None]]
+        held = np.moveaxis(held, 1, 0)
+
+        pnl = premium - disc[-1] * payoff + (held * gain).sum(axis = 2)
+        if self.transaction_cost > 0:
+            # initial purchase, every change in the hedge and the final unwind
+            trades = np.abs(np.diff(held, axis = 2, prepend = 0.0, append = 0.0))
+            notional = paths * disc
+            pnl -= self.transaction_cost * (trades * notional).sum(axis = 2)
+        return HedgeResult(rebalance_every, pnl, premium)
+
+
+def _test():
+    import time
+
+    pricing_date = datetime.date(2023, 12, 8)
+    r = 0.05
+    bs_model = BlackScholesModel(pricing_date, r)
+    simulator = DeltaHedgeSimulator(bs_model)
+
+    S0, K, T, sigma = 100.0, 100.0, 0.25, 0.2
+    paths = simulate_gbm_paths(S0, mu = 0.1, sigma = sigma, T = T, num_steps = 63, num_paths = 10000, seed = 42)
+
+    start = time.time()
+    result = simulator.run(paths, K, T, sigma, is_call = True, rebalance_every = [1, 2, 5, 21, 63])
+    print(f"Hedged {paths.shape[0]} paths on 5 schedules in {time.time() - start:.3f} seconds")
+    print('Premium:', result.premium)
+    # hedge error should grow roughly with the square root of the rebalance interval
+    print(result.summary())
+
+    # transaction costs trade off against the hedge error
+    costly = DeltaHedgeSimulator(bs_model, transaction_cost = 0.001)
+    print(costly.run(paths, K, T, sigma, is_call = False, rebalance_every = [1, 5, 21]).summary())
+
+
+if __name__ == "__main__":
+    _test()
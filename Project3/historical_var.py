@@ -0,0 +1,192 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Historical Simulation VaR and Expected Shortfall
+
+'''
+
+import os
+import time
+import datetime
+import sqlite3
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import option
+from financial_option import *
+from blackscholes_model import BlackScholesModel
+from volatility import VolatilityEstimator, load_ohlcv_panel
+
+
+class ScenarioSet(object):
+    '''
+    historical shock cube, spot_shocks and vol_shocks are (num_scenarios, num_underlyings) log changes
+    of the spot and of the volatility over the horizon, columns in the order of tickers
+    '''
+    def __init__(self, dates, tickers, spot_shocks, vol_shocks):
+        self.dates = dates
+        self.tickers = tickers
+        self.spot_shocks = spot_shocks
+        self.vol_shocks = vol_shocks
+
+    def __len__(self):
+        return self.spot_shocks.shape[0]
+
+
+def build_scenarios(close, dates = None, tickers = None, horizon = 1, vol_window = 21, num_scenarios = None):
+    '''
+    build the shock cube from a wide (date x ticker) array of closes. Spot shocks are the overlapping horizon-day
+    log returns, vol shocks the horizon-day log changes of the rolling close-to-close volatility.
+    Missing history gives a zero shock, the num_scenarios most recent days are kept
+    '''
+    close = np.asarray(close, dtype = float)
+    vol = VolatilityEstimator(vol_window).close_to_close(close)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        spot_shocks = np.log(close[horizon:] / close[:-horizon])
+        vol_shocks = np.log(vol[horizon:] / vol[:-horizon])
+    # the first rows have no volatility estimate yet
+    first = vol_window + horizon
+    spot_shocks = np.nan_to_num(spot_shocks[first:], nan = 0.0, posinf = 0.0, neginf = 0.0)
+    vol_shocks = np.nan_to_num(vol_shocks[first:], nan = 0.0, posinf = 0.0, neginf = 0.0)
+    dates = None if dates is None else list(dates)[horizon + first:]
+
+    if num_scenarios is not None:
+        spot_shocks, vol_shocks = spot_shocks[-num_scenarios:], vol_shocks[-num_scenarios:]
+        dates = None if dates is None else dates[-num_scenarios:]
+    return ScenarioSet(dates, tickers, spot_shocks, vol_shocks)
+
+def load_scenarios(db_connection, tickers, start_date, end_date, horizon = 1, vol_window = 21, num_scenarios = 1000):
+    '''
+    shock cube of the tickers from the EquityDailyPrice history between start_date and end_date
+    '''
+    close = load_ohlcv_panel(db_connection, tickers, start_date, end_date)['Close']
+    return build_scenarios(close.values, close.index, list(tickers), horizon, vol_window, num_scenarios)
+
+
+class HistoricalVaREngine(object):
+    '''
+    Full revaluation historical simulation for a European OptionBook
+
+    Every contract is repriced under every scenario with the batch Black-Scholes pricer: the book is cut into
+    chunks of chunk_size contracts, each chunk is priced as one (num_scenarios, chunk_size) array and reduced to a
+    P&L vector right away, so memory stays bounded by the chunk. num_workers > 1 spreads the chunks across
+    a process pool, the scenario cube is sent once to every worker. The time to expiry of each contract is
+    reduced by the horizon, so the P&L includes the time decay
+    '''
+
+    def __init__(self, model, horizon_days = 1, chunk_size = 2048, num_workers = 1, trading_days = 252):
+        self.model = model
+        self.horizon_days = horizon_days
+        self.chunk_size = chunk_size
+        self.num_workers = num_workers
+        self.trading_days = trading_days
+
+    def calc_pnl(self, book, quantity, scenarios):
+        '''
+        P&L of the book holding quantity of each contract under every scenario, shape (num_scenarios,).
+        The scenario columns follow the book underlyings
+        '''
+        if book.is_american.any():
+            raise Exception("Historical VaR for American options not implemented yet")
+        if scenarios.spot_shocks.shape[1] != book.spot.shape[0]:
+            raise Exception("Scenario columns do not match the book underlyings")
+
+        quantity = np.broadcast_to(np.asarray(quantity, dtype = float), (len(book),))
+        dt = self.horizon_days / self.trading_days
+        tasks = [(self.model.risk_free_rate, dt, book.spot, book.sigma, book.dividend_yield,
+                  book.underlying_id[i:i + self.chunk_size], book.strike[i:i + self.chunk_size],
+                  book.time_to_expiry[i:i + self.chunk_size], book.is_call[i:i + self.chunk_size],
+                  quantity[i:i + self.chunk_size]) for i in range(0, len(book), self.chunk_size)]
+
+        if self.num_workers > 1:
+            with ProcessPoolExecutor(max_workers = self.num_workers, initializer = _init_scenarios,
+                                     initargs = (scenarios.spot_shocks, scenarios.vol_shocks)) as executor:
+                pnl = list(executor.map(_revalue_chunk, tasks))
+        else:
+            _init_scenarios(scenarios.spot_shocks, scenarios.vol_shocks)
+            pnl = [_revalue_chunk(task) for task in tasks]
+        return np.sum(pnl, axis = 0)
+
+    def calc_var(self, book, quantity, scenarios, levels = (0.95, 0.975, 0.99)):
+        '''
+        VaR and expected shortfall of the book at every confidence level, reported as positive losses
+        '''
+        return var_es(self.calc_pnl(book, quantity, scenarios), levels)
+
+
+def var_es(pnl, levels = (0.95, 0.975, 0.99)):
+    # VaR is the level quantile of the loss, ES the mean loss beyond it
+    loss = np.sort(-np.asarray(pnl, dtype = float))
+    var = np.quantile(loss, levels)
+    es = [loss[loss >= v].mean() for v in var]
+    return pd.DataFrame({'level': levels, 'var': var, 'es': es})
+
+
+# scenario cube of the current process, set once per worker by the pool initializer
+_spot_shocks = None
+_vol_shocks = None
+
+def _init_scenarios(spot_shocks, vol_shocks):
+    global _spot_shocks, _vol_shocks
+    _spot_shocks = spot_shocks
+    _vol_shocks = vol_shocks
+
+def _revalue_chunk(task):
+    '''
+    reprice one chunk of contracts under all the scenarios and return its P&L per scenario
+    '''
+    risk_free_rate, dt, spot, sigma, dividend_yield, underlying_id, K, T, is_call, quantity = task
+    model = BlackScholesModel(None, risk_free_rate)
+    S0, sig, q = spot[underlying_id], sigma[underlying_id], dividend_yield[underlying_id]
+
+    base = model.calc_model_price_batch(S0, K, T, sig, q, is_call)
+    shocked = model.calc_model_price_batch(S0 * np.exp(_spot_shocks[:, underlying_id]), K,
+                                           np.maximum(T - dt, 1e-8), sig * np.exp(_vol_shocks[:, underlying_id]),
+                                           q, is_call)
+    return (shocked - base) @ quantity
+
+
+def _test():
+    from benchmark import make_synthetic_book
+
+    pricing_date = datetime.date(2023, 12, 8)
+    bs_model = BlackScholesModel(pricing_date, 0.05)
+
+    # synthetic history with fat tails for 100 underlyings
+    rng = np.random.default_rng(0)
+    num_underlyings, num_days = 100, 1100
+    daily_vol = rng.uniform(0.1, 0.5, num_underlyings) / np.sqrt(252)
+    returns = daily_vol * rng.standard_t(4, (num_days, num_underlyings)) / np.sqrt(2)
+    close = 100 * np.exp(np.cumsum(returns, axis = 0))
+    scenarios = build_scenarios(close, num_scenarios = 1000)
+    print('Scenarios:', len(scenarios))
+
+    book = make_synthetic_book(20000, num_underlyings, seed = 1)
+    quantity = rng.choice([-10.0, -5.0, 5.0, 10.0], len(book))
+    for workers in (1, 4):
+        engine = HistoricalVaREngine(bs_model, num_workers = workers)
+        start = time.time()
+        pnl = engine.calc_pnl(book, quantity, scenarios)
+        elapsed = time.time() - start
+        print(f"{workers} workers: {len(book) * len(scenarios) / elapsed:,.0f} revaluations/sec")
+    print(var_es(pnl))
+
+    # the scenario cube from the database
+    parser = option.get_default_parser()
+    parser.add_argument('--data_dir', dest = 'data_dir', default = './data', help = 'data dir')
+    args = parser.parse_args()
+    opt = option.Option(args = args)
+    opt.sqlite_db = os.path.join(opt.data_dir, "sqlitedb/Equity.db")
+    if os.path.exists(opt.sqlite_db):
+        db_connection = sqlite3.connect(opt.sqlite_db)
+        print(len(load_scenarios(db_connection, ['AAPL', 'MSFT'], datetime.date(2019, 1, 1), datetime.date(2023, 12, 1))))
+
+
+if __name__ == "__main__":
+    _test()
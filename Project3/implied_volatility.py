@@ -0,0 +1,187 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Implied Volatility Solver
+
+'''
+
+import datetime
+import numpy as np
+import pandas as pd
+
+from blackscholes_model import BlackScholesModel
+
+
+class ImpliedVolatilityResult(object):
+    '''
+    implied_vol is nan for the contracts that did not converge,
+    converged is the per-contract convergence mask and iterations the number of iterations each contract used
+    '''
+
+    # failure reason codes
+    OK = 0
+    BELOW_INTRINSIC = 1
+    ABOVE_UPPER_BOUND = 2
+    MAX_ITERATIONS = 3
+    BRACKET_COLLAPSED = 4
+
+    _reason_names = {OK: 'ok', BELOW_INTRINSIC: 'below intrinsic value',
+                     ABOVE_UPPER_BOUND: 'above upper bound', MAX_ITERATIONS: 'max iterations reached',
+                     BRACKET_COLLAPSED: 'bracket collapsed without price convergence'}
+
+    def __init__(self, implied_vol, converged, iterations, reason, market_price):
+        self.implied_vol = implied_vol
+        self.converged = converged
+        self.iterations = iterations
+        self.reason = reason
+        self.market_price = market_price
+
+    @property
+    def failed(self):
+        # positions of the contracts that failed to converge
+        return np.flatnonzero(~self.converged)
+
+    def failure_report(self):
+        '''
+        return a DataFrame with one row per contract that failed to converge
+        '''
+        idx = self.failed
+        return pd.DataFrame({'index': idx,
+                             'market_price': self.market_price[idx],
+                             'iterations': self.iterations[idx],
+                             'reason': [self._reason_names[x] for x in self.reason[idx]]})
+
+
+class ImpliedVolatilitySolver(object):
+    '''
+    Solve the Black-Scholes implied volatility of a whole chain of market prices at once.
+
+    Every contract runs a safeguarded Newton iteration on vega inside its own [sigma_low, sigma_high] bracket.
+    The bracket shrinks after each step and the step falls back to bisection whenever Newton would leave it
+    or vega is too small, so every contract converges as long as its price is inside the no-arbitrage bounds
+    and its volatility inside [sigma_low, sigma_high]. A bracket that collapses onto one of its ends without
+    matching the price is reported as a failure.
+    '''
+
+    def __init__(self, model, tol = 1e-8, max_iter = 100, sigma_low = 1e-4, sigma_high = 5.0):
+        self.model = model
+        self.tol = tol
+        self.max_iter = max_iter
+        self.sigma_low = sigma_low
+        self.sigma_high = sigma_high
+
+    def solve(self, market_price, spot, strike = None, time_to_expiry = None, dividend_yield = 0.0, is_call = True):
+        '''
+        market_price is an array of option prices, the other inputs follow BlackScholesModel.calc_model_price_batch
+        (spot can be a list of FinancialOption objects whose sigma is ignored).
+        Returns an ImpliedVolatilityResult
+        '''
+        S0, K, T, _, q, is_call, r = self.model._batch_inputs(spot, strike, time_to_expiry, 1.0,
+                                                              dividend_yield, is_call, None)
+        price, S0, K, T, q, is_call, r = [np.ravel(x) for x in
+                                          np.broadcast_arrays(np.asarray(market_price, dtype = float),
+                                                              S0, K, T, q, is_call, r)]
+
+        n = S0.shape[0]
+        implied_vol = np.full(n, np.nan)
+        converged = np.zeros(n, dtype = bool)
+        iterations = np.zeros(n, dtype = int)
+        reason = np.full(n, ImpliedVolatilityResult.MAX_ITERATIONS, dtype = np.int8)
+
+        # no-arbitrage bounds, outside of them no volatility can reproduce the price
+        S_q = S0 * np.exp(-q * T)
+        K_r = K * np.exp(-r * T)
+        lower = np.where(is_call, np.maximum(S_q - K_r, 0.0), np.maximum(K_r - S_q, 0.0))
+        upper = np.where(is_call, S_q, K_r)
+        below = price < lower - self.tol
+        above = price >= upper
+        reason[below] = ImpliedVolatilityResult.BELOW_INTRINSIC
+        reason[above] = ImpliedVolatilityResult.ABOVE_UPPER_BOUND
+
+        active = np.flatnonzero(~below & ~above)
+        lo = np.full(active.shape[0], self.sigma_low)
+        hi = np.full(active.shape[0], self.sigma_high)
+        # start from the Brenner-Subrahmanyam / Manaster-Koehler moneyness seed sqrt(2 |log(S_q / K_r)| / T),
+        # which keeps Newton monotone for most of the chain
+        sigma = np.sqrt(2 * np.abs(np.log(S_q[active] / K_r[active])) / T[active])
+        sigma = np.where((sigma > lo) & (sigma < hi), sigma, 0.2)
+
+        for i in range(1, self.max_iter + 1):
+            if active.shape[0] == 0:
+                break
+            greeks = self.model.calc_price_and_greeks(S0[active], K[active], T[active], sigma, q[active],
+                                                      is_call[active], r[active])
+            diff = greeks['price'] - price[active]
+            iterations[active] = i
+
+            # shrink the bracket around the root, price is increasing in sigma
+            hi = np.where(diff > 0, sigma, hi)
+            lo = np.where(diff <= 0, sigma, lo)
+
+            ok = np.abs(diff) < self.tol
+            collapsed = ~ok & (hi - lo < self.tol)
+            implied_vol[active[ok]] = sigma[ok]
+            converged[active[ok]] = True
+            reason[active[ok]] = ImpliedVolatilityResult.OK
+            reason[active[collapsed]] = ImpliedVolatilityResult.BRACKET_COLLAPSED
+            done = ok | collapsed
+
+            # newton step, bisect where it is undefined or jumps out of the bracket
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                newton = sigma - diff / greeks['vega']
+            bisect = ~np.isfinite(newton) | (newton <= lo) | (newton >= hi)
+            sigma = np.where(bisect, (lo + hi) / 2, newton)
+
+            keep = ~done
+            active, sigma, lo, hi = active[keep], sigma[keep], lo[keep], hi[keep]
+
+        return ImpliedVolatilityResult(implied_vol, converged, iterations, reason, price)
+
+
+def _test():
+    import time
+
+    pricing_date = datetime.date(2023, 12, 8)
+    bs_model = BlackScholesModel(pricing_date, 0.05)
+    solver = ImpliedVolatilitySolver(bs_model)
+
+    # round trip a synthetic chain of 100k quotes
+    n = 100000
+    rng = np.random.default_rng(42)
+    S0 = rng.uniform(20, 200, n)
+    K = S0 * rng.uniform(0.5, 1.5, n)
+    T = rng.uniform(0.02, 2.0, n)
+    sigma = rng.uniform(0.05, 1.0, n)
+    q = rng.uniform(0.0, 0.03, n)
+    is_call = rng.random(n) < 0.5
+    price = bs_model.calc_model_price_batch(S0, K, T, sigma, q, is_call)
+
+    start = time.time()
+    result = solver.solve(price, S0, K, T, q, is_call)
+    print(f"Solved {n} quotes in {time.time() - start:.3f} seconds")
+    print('Converged:', result.converged.sum(), 'Max iterations:', result.iterations.max())
+
+    ok = result.converged & (bs_model.calc_price_and_greeks(S0, K, T, sigma, q, is_call)['vega'] > 1e-4)
+    print('Max vol error:', np.abs(result.implied_vol[ok] - sigma[ok]).max())
+
+    # prices outside the no-arbitrage bounds are reported instead of solved
+    bad = solver.solve(np.array([0.01, 500.0]), 100.0, 80.0, 1.0, 0.0, True)
+    print(bad.failure_report())
+
+    # just under the upper bound the root is above sigma_high, the bracket collapses there and is not a solution
+    zero_rate = ImpliedVolatilitySolver(BlackScholesModel(pricing_date, 0.0))
+    near_bound = bs_model.calc_model_price_batch(100.0, 100.0, 1.0, 6.0, 0.0, True, risk_free_rate = 0.0)
+    result = zero_rate.solve(near_bound, 100.0, 100.0, 1.0, 0.0, True)
+    assert not result.converged[0] and np.isnan(result.implied_vol[0])
+    assert result.reason[0] == ImpliedVolatilityResult.BRACKET_COLLAPSED
+    print(f"Price {float(near_bound):.4f} near the upper bound:")
+    print(result.failure_report())
+
+
+if __name__ == "__main__":
+    _test()
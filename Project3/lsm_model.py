@@ -0,0 +1,140 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Longstaff-Schwartz Least Squares Monte Carlo Model
+
+'''
+
+import time
+import datetime
+import numpy as np
+from numpy.polynomial import laguerre
+
+from stock import Stock
+from financial_option import *
+from monte_carlo_model import MonteCarloResult
+
+
+class LongstaffSchwartzModel(object):
+    '''
+    Least squares Monte Carlo pricing of American options under geometric Brownian motion
+
+    The exercise dates are the num_steps points of the simulation grid. Going backward from expiry, the
+    discounted future cash flows of the in-the-money paths are regressed on the basis functions of the spot
+    in one least squares solve over all paths, and the paths whose exercise value beats the fitted continuation
+    value exercise.
+
+    The paths are generated backward with a Brownian bridge: W_T is drawn first and each earlier point is drawn
+    conditional on the later one, so only the current time slice is kept in memory (num_paths floats rather than
+    num_paths x num_steps).
+
+    basis is 'laguerre' (weighted Laguerre polynomials as in Longstaff and Schwartz) or 'polynomial',
+    in the moneyness S/K, up to degree
+    '''
+
+    LAGUERRE = 'laguerre'
+    POLYNOMIAL = 'polynomial'
+
+    def __init__(self, pricing_date, risk_free_rate, num_paths = 100000, num_steps = 50, basis = 'laguerre',
+                 degree = 3, seed = None):
+        self.pricing_date = pricing_date
+        self.risk_free_rate = risk_free_rate
+        self.num_paths = num_paths
+        self.num_steps = num_steps
+        self.basis = basis
+        self.degree = degree
+        self.seed = seed
+
+    def calc_model_price(self, option):
+        '''
+        return a MonteCarloResult, European options are simply held to expiry
+        '''
+        if self.basis not in (LongstaffSchwartzModel.LAGUERRE, LongstaffSchwartzModel.POLYNOMIAL):
+            raise Exception(f"Unsupported basis {self.basis}")
+
+        start = time.time()
+        S0 = option.underlying.spot_price
+        sigma = option.underlying.sigma
+        q = option.underlying.dividend_yield
+        T = option.time_to_expiry
+        K = option.strike
+        r = self.risk_free_rate
+        sign = 1.0 if option.option_type == FinancialOption.Type.CALL else -1.0
+        american = option.option_style == FinancialOption.Style.AMERICAN
+
+        rng = np.random.default_rng(self.seed)
+        N, n = self.num_steps, self.num_paths
+        dt = T / N
+        drift = r - q - sigma ** 2 / 2
+        disc = np.exp(-r * dt)
+
+        # terminal slice and cash flows at expiry
+        W = np.sqrt(T) * rng.standard_normal(n)
+        S = S0 * np.exp(drift * T + sigma * W)
+        V = np.maximum(sign * (S - K), 0.0)
+
+        for k in range(N - 1, 0, -1):
+            # Brownian bridge step back from t_(k+1) to t_k, pinned at W_0 = 0
+            t = k * dt
+            W = W * k / (k + 1) + np.sqrt(dt * k / (k + 1)) * rng.standard_normal(n)
+            S = S0 * np.exp(drift * t + sigma * W)
+            V *= disc
+            if not american:
+                continue
+
+            exercise = np.maximum(sign * (S - K), 0.0)
+            itm = exercise > 0
+            if itm.sum() <= self.degree + 1:
+                continue
+            X = self._basis_functions(S[itm] / K)
+            coef = np.linalg.lstsq(X, V[itm], rcond = None)[0]
+            exercise_now = exercise[itm] > X @ coef
+            V[np.flatnonzero(itm)[exercise_now]] = exercise[itm][exercise_now]
+
+        V *= disc
+        price = float(V.mean())
+        if american:
+            # exercising at time 0 is always possible
+            price = max(price, max(sign * (S0 - K), 0.0))
+        return MonteCarloResult(price, V.std(ddof = 1) / np.sqrt(n), n, time.time() - start)
+
+    def _basis_functions(self, x):
+        # regression design matrix with a constant column, one row per in-the-money path
+        if self.basis == LongstaffSchwartzModel.LAGUERRE:
+            return np.exp(-x / 2)[:, None] * laguerre.lagvander(x, self.degree)
+        return np.vander(x, self.degree + 1, increasing = True)
+
+
+def _test():
+    from binomial_model import BinomialTreeModel
+    from blackscholes_model import BlackScholesModel
+
+    pricing_date = datetime.date(2023, 12, 8)
+    r = 0.06
+    binomial = BinomialTreeModel(pricing_date, r, num_steps = 2000)
+
+    # the put grid of Longstaff and Schwartz (2001), table 1
+    for S0, sigma, T in ((36, 0.2, 1.0), (40, 0.2, 1.0), (44, 0.2, 1.0), (36, 0.4, 2.0), (44, 0.4, 2.0)):
+        stock = Stock(None, None, 'XYZ', spot_price = S0, sigma = sigma)
+        put = AmericanPutOption(stock, T, 40)
+        reference = binomial.calc_model_price(put)
+        for basis in (LongstaffSchwartzModel.LAGUERRE, LongstaffSchwartzModel.POLYNOMIAL):
+            lsm = LongstaffSchwartzModel(pricing_date, r, num_paths = 100000, num_steps = int(50 * T),
+                                         basis = basis, seed = 42)
+            result = lsm.calc_model_price(put)
+            print(f"S0={S0} sigma={sigma} T={T} {basis:<10} LSM {result.price:.4f} +- {result.std_error:.4f}"
+                  f"  binomial {reference:.4f}  {result.elapsed:.2f}s")
+
+    stock = Stock(None, None, 'XYZ', spot_price = 36, sigma = 0.2)
+    european = EuropeanPutOption(stock, 1.0, 40)
+    print('European LSM:', LongstaffSchwartzModel(pricing_date, r, seed = 42).calc_model_price(european).price,
+          'B\\S:', BlackScholesModel(pricing_date, r).calc_model_price(european))
+
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,432 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Monte Carlo Model
+
+'''
+
+import time
+import datetime
+import numpy as np
+from scipy.stats import qmc
+from scipy.special import ndtri
+from concurrent.futures import ProcessPoolExecutor
+
+from stock import Stock
+from financial_option import *
+from blackscholes_model import BlackScholesModel, option_arrays
+
+
+def vanilla_payoff(paths, strike, sign):
+    # European payoff on the last column of the simulated paths
+    return np.maximum(sign * (paths[:, -1] - strike), 0.0)
+
+def asian_payoff(paths, strike, sign):
+    # arithmetic average price payoff over the monitoring dates (the spot at time 0 is excluded)
+    return np.maximum(sign * (paths[:, 1:].mean(axis = 1) - strike), 0.0)
+
+# payoffs of the form max(sign * (A - K), 0), keyed to the function computing the path aggregate A,
+# these support pathwise Greeks
+_payoff_aggregates = {vanilla_payoff: lambda paths: paths[:, -1],
+                      asian_payoff: lambda paths: paths[:, 1:].mean(axis = 1)}
+
+
+class MonteCarloResult(object):
+    '''
+    price with its standard error, and the throughput of the simulation
+    '''
+    def __init__(self, price, std_error, num_paths, elapsed):
+        self.price = price
+        self.std_error = std_error
+        self.num_paths = num_paths
+        self.elapsed = elapsed
+        self.paths_per_sec = num_paths / elapsed if elapsed > 0 else float('inf')
+
+    def __repr__(self):
+        return (f"MonteCarloResult(price={self.price:.6f}, std_error={self.std_error:.6f}, "
+                f"num_paths={self.num_paths}, paths_per_sec={self.paths_per_sec:,.0f})")
+
+
+class MonteCarloGreeksResult(MonteCarloResult):
+    '''
+    price, delta, gamma and vega estimated from the same paths, std_errors maps each of them to its standard error
+    '''
+    def __init__(self, price, delta, gamma, vega, std_errors, method, num_paths, elapsed):
+        MonteCarloResult.__init__(self, price, std_errors['price'], num_paths, elapsed)
+        self.delta = delta
+        self.gamma = gamma
+        self.vega = vega
+        self.std_errors = std_errors
+        self.method = method
+
+    def __repr__(self):
+        return (f"MonteCarloGreeksResult(price={self.price:.6f}, delta={self.delta:.6f}, gamma={self.gamma:.6f}, "
+                f"vega={self.vega:.6f}, method={self.method}, num_paths={self.num_paths})")
+
+
+class MonteCarloModel(object):
+    '''
+    Monte Carlo pricing of European style options under geometric Brownian motion
+
+    Paths are simulated in chunks of chunk_size so memory stays bounded whatever num_paths is.
+    Each chunk gets its own random stream spawned from SeedSequence(seed), so the result only depends
+    on the seed and the chunking, not on num_workers which spreads the chunks across a process pool.
+
+    variance_reduction is one of
+        plain           : independent paths
+        antithetic      : every normal draw Z is paired with -Z
+        control_variate : the European payoff on the same paths is the control,
+                          with its closed form Black-Scholes price as the known mean. For the European
+                          payoff itself the control is the discounted terminal spot, with mean S0 exp(-qT)
+        qmc             : scrambled Sobol points mapped to paths with a Brownian bridge, so the first
+                          coordinates drive the coarse shape of the path. The paths are split into
+                          num_replications independently scrambled sequences (each rounded to a power of two
+                          points), the standard error comes from the spread of the replication means
+    '''
+
+    PLAIN = 'plain'
+    ANTITHETIC = 'antithetic'
+    CONTROL_VARIATE = 'control_variate'
+    QMC = 'qmc'
+
+    PATHWISE = 'pathwise'
+    LIKELIHOOD_RATIO = 'likelihood_ratio'
+
+    def __init__(self, pricing_date, risk_free_rate, num_paths = 1000000, num_steps = 1, chunk_size = 100000,
+                 variance_reduction = 'plain', num_workers = 1, seed = None, num_replications = 16):
+        self.pricing_date = pricing_date
+        self.risk_free_rate = risk_free_rate
+        self.num_paths = num_paths
+        self.num_steps = num_steps
+        self.chunk_size = chunk_size
+        self.variance_reduction = variance_reduction
+        self.num_workers = num_workers
+        self.seed = seed
+        self.num_replications = num_replications
+
+    def calc_model_price(self, option, payoff = vanilla_payoff):
+        '''
+        Simulate the option payoff and return a MonteCarloResult
+
+        payoff is a module level function payoff(paths, strike, sign) returning the undiscounted payoff per path,
+        where paths is (n, num_steps + 1) including the spot at time 0 and sign is +1 for calls and -1 for puts
+        '''
+        if option.option_style == FinancialOption.Style.AMERICAN:
+            raise Exception("Monte Carlo price for American option not implemented yet")
+        if self.variance_reduction not in (MonteCarloModel.PLAIN, MonteCarloModel.ANTITHETIC,
+                                           MonteCarloModel.CONTROL_VARIATE, MonteCarloModel.QMC):
+            raise Exception(f"Unsupported variance reduction {self.variance_reduction}")
+
+        start = time.time()
+        S0 = option.underlying.spot_price
+        sigma = option.underlying.sigma
+        q = option.underlying.dividend_yield
+        T = option.time_to_expiry
+        K = option.strike
+        r = self.risk_free_rate
+        sign = 1.0 if option.option_type == FinancialOption.Type.CALL else -1.0
+
+        if self.variance_reduction == MonteCarloModel.QMC:
+            return self._calc_qmc_price(S0, K, T, r, q, sigma, sign, payoff, start)
+
+        sizes = [min(self.chunk_size, self.num_paths - i) for i in range(0, self.num_paths, self.chunk_size)]
+        streams = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        tasks = [(stream, n, S0, K, T, r, q, sigma, sign, self.num_steps, self.variance_reduction, payoff)
+                 for stream, n in zip(streams, sizes)]
+
+        if self.num_workers > 1:
+            with ProcessPoolExecutor(max_workers = self.num_workers) as executor:
+                sums = list(executor.map(_simulate_chunk, tasks))
+        else:
+            sums = [_simulate_chunk(task) for task in tasks]
+        n, sum_y, sum_yy, sum_x, sum_xx, sum_xy = np.sum(sums, axis = 0)
+
+        mean_y = sum_y / n
+        var_y = (sum_yy - n * mean_y ** 2) / (n - 1)
+        if self.variance_reduction == MonteCarloModel.CONTROL_VARIATE:
+            # optimal coefficient from the pooled sums of all the chunks
+            if payoff is vanilla_payoff:
+                control_mean = S0 * np.exp(-q * T)
+            else:
+                control_mean = BlackScholesModel(self.pricing_date, r).calc_model_price(option)
+            mean_x = sum_x / n
+            var_x = (sum_xx - n * mean_x ** 2) / (n - 1)
+            cov_xy = (sum_xy - n * mean_x * mean_y) / (n - 1)
+            beta = cov_xy / var_x if var_x > 0 else 0.0
+            price = mean_y - beta * (mean_x - control_mean)
+            var_y = max(var_y - beta * cov_xy, 0.0)
+        else:
+            price = mean_y
+
+        return MonteCarloResult(price, np.sqrt(var_y / n), self.num_paths, time.time() - start)
+
+    def _calc_qmc_price(self, S0, K, T, r, q, sigma, sign, payoff, start):
+        # one task per scrambled replication, the replication means are independent samples of the price
+        R = self.num_replications
+        points = 2 ** max(int(np.log2(max(self.num_paths // R, 1))), 0)
+        chunk = 2 ** max(int(np.log2(min(self.chunk_size, points))), 0)
+        streams = np.random.SeedSequence(self.seed).spawn(R)
+        tasks = [(stream, points, chunk, S0, K, T, r, q, sigma, sign, self.num_steps, payoff) for stream in streams]
+
+        if self.num_workers > 1:
+            with ProcessPoolExecutor(max_workers = self.num_workers) as executor:
+                means = np.array(list(executor.map(_qmc_replication, tasks)))
+        else:
+            means = np.array([_qmc_replication(task) for task in tasks])
+        std_error = means.std(ddof = 1) / np.sqrt(R) if R > 1 else float('nan')
+        return MonteCarloResult(means.mean(), std_error, points * R, time.time() - start)
+
+    def calc_price_and_greeks(self, option, payoff = vanilla_payoff, method = 'pathwise'):
+        '''
+        Price, delta, gamma and vega in a single simulation pass, returned as a MonteCarloGreeksResult
+
+        pathwise         : delta and vega differentiate the payoff along each path, gamma applies the
+                           likelihood ratio to the pathwise delta. Needs a payoff listed in _payoff_aggregates
+        likelihood_ratio : the payoff is weighted by the score of the path density, works for any payoff
+                           but with a higher variance
+        '''
+        if option.option_style == FinancialOption.Style.AMERICAN:
+            raise Exception("Monte Carlo price for American option not implemented yet")
+        if self.variance_reduction not in (MonteCarloModel.PLAIN, MonteCarloModel.ANTITHETIC):
+            raise Exception(f"Unsupported variance reduction {self.variance_reduction} for Greeks")
+        if method == MonteCarloModel.PATHWISE and payoff not in _payoff_aggregates:
+            raise Exception("Pathwise Greeks need a payoff in _payoff_aggregates, use likelihood_ratio")
+        if method not in (MonteCarloModel.PATHWISE, MonteCarloModel.LIKELIHOOD_RATIO):
+            raise Exception(f"Unsupported Greeks method {method}")
+
+        start = time.time()
+        sign = 1.0 if option.option_type == FinancialOption.Type.CALL else -1.0
+        sizes = [min(self.chunk_size, self.num_paths - i) for i in range(0, self.num_paths, self.chunk_size)]
+        streams = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        tasks = [(stream, n, option.underlying.spot_price, option.strike, option.time_to_expiry, self.risk_free_rate,
+                  option.underlying.dividend_yield, option.underlying.sigma, sign, self.num_steps,
+                  self.variance_reduction == MonteCarloModel.ANTITHETIC, payoff, method)
+                 for stream, n in zip(streams, sizes)]
+
+        if self.num_workers > 1:
+            with ProcessPoolExecutor(max_workers = self.num_workers) as executor:
+                sums = list(executor.map(_greeks_chunk, tasks))
+        else:
+            sums = [_greeks_chunk(task) for task in tasks]
+        sums = np.sum(sums, axis = 0)
+
+        n = sums[0, 0]
+        mean = sums[1] / n
+        std_error = np.sqrt(np.maximum(sums[2] - n * mean ** 2, 0.0) / (n - 1) / n)
+        names = ('price', 'delta', 'gamma', 'vega')
+        return MonteCarloGreeksResult(*mean.tolist(), dict(zip(names, std_error.tolist())), method, self.num_paths,
+                                      time.time() - start)
+
+    def calc_model_price_batch(self, spot, strike = None, time_to_expiry = None, sigma = None,
+                               dividend_yield = 0.0, is_call = True, risk_free_rate = None, payoff = vanilla_payoff):
+        '''
+        Price many European contracts with common random numbers
+
+        Takes the same inputs as BlackScholesModel.calc_model_price_batch and returns the array of prices.
+        Every contract is driven by the same normal draws, so the price differences between contracts
+        (bumped inputs in particular) carry much less noise than independent simulations would
+        '''
+        if self.variance_reduction not in (MonteCarloModel.PLAIN, MonteCarloModel.ANTITHETIC):
+            raise Exception(f"Unsupported variance reduction {self.variance_reduction} for batch pricing")
+        if strike is None:
+            arrays = option_arrays(spot)
+            if arrays.is_american.any():
+                raise Exception("Monte Carlo price for American option not implemented yet")
+            spot, strike, time_to_expiry, sigma, dividend_yield, is_call = (
+                arrays.spot, arrays.strike, arrays.time_to_expiry, arrays.sigma, arrays.dividend_yield, arrays.is_call)
+        r = self.risk_free_rate if risk_free_rate is None else risk_free_rate
+        S0, K, T, sigma, q, r, is_call = np.broadcast_arrays(*[np.asarray(x, dtype = float) for x in
+                                                               (spot, strike, time_to_expiry, sigma, dividend_yield, r)],
+                                                             np.asarray(is_call, dtype = bool))
+        shape = S0.shape
+        sign = np.where(is_call, 1.0, -1.0).ravel()
+        inputs = [x.ravel() for x in (S0, K, T, r, q, sigma)]
+
+        sizes = [min(self.chunk_size, self.num_paths - i) for i in range(0, self.num_paths, self.chunk_size)]
+        streams = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        antithetic = self.variance_reduction == MonteCarloModel.ANTITHETIC
+        tasks = [(stream, n, *inputs, sign, self.num_steps, antithetic, payoff) for stream, n in zip(streams, sizes)]
+
+        if self.num_workers > 1:
+            with ProcessPoolExecutor(max_workers = self.num_workers) as executor:
+                sums = list(executor.map(_simulate_batch_chunk, tasks))
+        else:
+            sums = [_simulate_batch_chunk(task) for task in tasks]
+        num_paths = sum(n // 2 * 2 for n in sizes) if antithetic else self.num_paths
+        return (np.sum(sums, axis = 0) / num_paths).reshape(shape)
+
+
+def _standard_normals(rng, n, num_steps, antithetic):
+    # antithetic mode returns the n/2 draws Z followed by -Z
+    if antithetic:
+        Z = rng.standard_normal((n // 2, num_steps))
+        return np.concatenate([Z, -Z])
+    return rng.standard_normal((n, num_steps))
+
+def _brownian_bridge(Z):
+    '''
+    map the normals Z of shape (n, num_steps) to standard normal increments on the uniform time grid,
+    column 0 sets the terminal value and each further column fills the midpoint of the widest remaining gap
+    '''
+    n, d = Z.shape
+    W = np.zeros((n, d + 1))
+    W[:, d] = np.sqrt(d) * Z[:, 0]
+    intervals = [(0, d)]
+    k = 1
+    # breadth first, so the leading coordinates of the Sobol points go to the coarse scales
+    while intervals:
+        left, right = intervals.pop(0)
+        if right - left < 2:
+            continue
+        mid = (left + right) // 2
+        a, b = mid - left, right - mid
+        W[:, mid] = (b * W[:, left] + a * W[:, right]) / (right - left) + np.sqrt(a * b / (right - left)) * Z[:, k]
+        k += 1
+        intervals += [(left, mid), (mid, right)]
+    # time is measured in steps here, so the increments are standard normal
+    return np.diff(W, axis = 1)
+
+def _qmc_replication(task):
+    '''
+    mean discounted payoff over one scrambled Sobol sequence, drawn in chunks of a power of two points
+    '''
+    stream, points, chunk, S0, K, T, r, q, sigma, sign, num_steps, payoff = task
+    sampler = qmc.Sobol(d = num_steps, scramble = True, seed = np.random.default_rng(stream))
+    total = 0.0
+    for _ in range(points // chunk):
+        Z = _brownian_bridge(ndtri(sampler.random(chunk)))
+        total += payoff(_gbm_paths(Z, S0, T, r, q, sigma), K, sign).sum()
+    return np.exp(-r * T) * total / points
+
+def _simulate_paths(rng, n, S0, T, r, q, sigma, num_steps, antithetic):
+    return _gbm_paths(_standard_normals(rng, n, num_steps, antithetic), S0, T, r, q, sigma)
+
+def _gbm_paths(Z, S0, T, r, q, sigma):
+    # exact GBM log-increments driven by the normal draws Z of shape (n, num_steps)
+    num_steps = Z.shape[1]
+    dt = T / num_steps
+    log_paths = np.empty((Z.shape[0], num_steps + 1))
+    log_paths[:, 0] = np.log(S0)
+    np.cumsum((r - q - sigma ** 2 / 2) * dt + sigma * np.sqrt(dt) * Z, axis = 1, out = log_paths[:, 1:])
+    log_paths[:, 1:] += log_paths[:, :1]
+    return np.exp(log_paths)
+
+def _simulate_chunk(task):
+    '''
+    simulate one chunk and return the sufficient statistics (n, sum y, sum y^2, sum x, sum x^2, sum xy)
+    of the discounted payoff y and the discounted control x, the European payoff or for the European payoff
+    itself the terminal spot
+    '''
+    stream, n, S0, K, T, r, q, sigma, sign, num_steps, variance_reduction, payoff = task
+    rng = np.random.default_rng(stream)
+    antithetic = variance_reduction == MonteCarloModel.ANTITHETIC
+    paths = _simulate_paths(rng, n, S0, T, r, q, sigma, num_steps, antithetic)
+    disc = np.exp(-r * T)
+
+    y = disc * payoff(paths, K, sign)
+    if antithetic:
+        # each antithetic pair is one independent sample
+        half = y.shape[0] // 2
+        y = (y[:half] + y[half:]) / 2
+    if variance_reduction == MonteCarloModel.CONTROL_VARIATE:
+        x = disc * (paths[:, -1] if payoff is vanilla_payoff else vanilla_payoff(paths, K, sign))
+    else:
+        x = np.zeros_like(y)
+    return np.array([y.shape[0], y.sum(), y @ y, x.sum(), x @ x, x @ y])
+
+def _greeks_chunk(task):
+    '''
+    simulate one chunk and return the rows (n, sum x, sum x^2) of the price, delta, gamma and vega samples
+    '''
+    stream, n, S0, K, T, r, q, sigma, sign, num_steps, antithetic, payoff, method = task
+    rng = np.random.default_rng(stream)
+    Z = _standard_normals(rng, n, num_steps, antithetic)
+    paths = _gbm_paths(Z, S0, T, r, q, sigma)
+    dt = T / num_steps
+    disc = np.exp(-r * T)
+    y = disc * payoff(paths, K, sign)
+    # score of the first step with respect to the spot, the only step that depends on S0
+    score_1 = Z[:, 0] / (S0 * sigma * np.sqrt(dt))
+
+    if method == MonteCarloModel.PATHWISE:
+        aggregate = _payoff_aggregates[payoff]
+        slope = disc * sign * (sign * (aggregate(paths) - K) > 0)
+        # dS_t/dS0 = S_t/S0 and dS_t/dsigma = S_t (W_t - sigma t)
+        delta = slope * aggregate(paths) / S0
+        W = np.zeros_like(paths)
+        np.cumsum(np.sqrt(dt) * Z, axis = 1, out = W[:, 1:])
+        t = dt * np.arange(num_steps + 1)
+        vega = slope * aggregate(paths * (W - sigma * t))
+        gamma = delta * (score_1 - 1 / S0)
+    else:
+        delta = y * score_1
+        gamma = y * (score_1 ** 2 - Z[:, 0] / (S0 ** 2 * sigma * np.sqrt(dt)) - 1 / (S0 ** 2 * sigma ** 2 * dt))
+        vega = y * ((Z ** 2 - 1) / sigma - Z * np.sqrt(dt)).sum(axis = 1)
+
+    samples = np.stack([y, delta, gamma, vega])
+    if antithetic:
+        # each antithetic pair is one independent sample
+        half = samples.shape[1] // 2
+        samples = (samples[:, :half] + samples[:, half:]) / 2
+    return np.stack([np.full(4, samples.shape[1]), samples.sum(axis = 1), (samples ** 2).sum(axis = 1)])
+
+def _simulate_batch_chunk(task):
+    '''
+    sum of the discounted payoffs of every contract over one chunk, all contracts share the chunk's normal draws
+    '''
+    stream, n, S0, K, T, r, q, sigma, sign, num_steps, antithetic, payoff = task
+    rng = np.random.default_rng(stream)
+    Z = _standard_normals(rng, n, num_steps, antithetic)
+    sums = np.empty(S0.shape[0])
+    for i in range(S0.shape[0]):
+        paths = _gbm_paths(Z, S0[i], T[i], r[i], q[i], sigma[i])
+        sums[i] = np.exp(-r[i] * T[i]) * payoff(paths, K[i], sign[i]).sum()
+    return sums
+
+
+def _test():
+    pricing_date = datetime.date(2023, 12, 8)
+    r = 0.1
+    stock = Stock(None, None, 'AAPL', spot_price = 42, sigma = 0.2)
+    option_call = EuropeanCallOption(stock, time_to_expiry = 0.5, strike = 40)
+
+    bs_model = BlackScholesModel(pricing_date, r)
+    print('B\\S Call Price:', bs_model.calc_model_price(option_call))
+
+    for mode in (MonteCarloModel.PLAIN, MonteCarloModel.ANTITHETIC, MonteCarloModel.CONTROL_VARIATE):
+        mc_model = MonteCarloModel(pricing_date, r, num_paths = 1000000, variance_reduction = mode, seed = 42)
+        print(f"{mode}:", mc_model.calc_model_price(option_call))
+
+    # path dependent payoff where the European control actually helps, spread over 4 processes
+    for mode in (MonteCarloModel.PLAIN, MonteCarloModel.CONTROL_VARIATE):
+        mc_model = MonteCarloModel(pricing_date, r, num_paths = 1000000, num_steps = 20, chunk_size = 50000,
+                                   variance_reduction = mode, num_workers = 4, seed = 42)
+        print(f"Asian {mode}:", mc_model.calc_model_price(option_call, payoff = asian_payoff))
+
+    # single pass Greeks against the closed form
+    option_put = EuropeanPutOption(stock, time_to_expiry = 0.5, strike = 40)
+    mc_model = MonteCarloModel(pricing_date, r, num_paths = 1000000, seed = 42)
+    for option in (option_call, option_put):
+        print('B\\S delta, gamma, vega:', bs_model.calc_delta(option), bs_model.calc_gamma(option),
+              bs_model.calc_vega(option))
+        for method in (MonteCarloModel.PATHWISE, MonteCarloModel.LIKELIHOOD_RATIO):
+            result = mc_model.calc_price_and_greeks(option, method = method)
+            print(f"  {result}", {k: round(v, 5) for k, v in result.std_errors.items()})
+    asian = MonteCarloModel(pricing_date, r, num_paths = 200000, num_steps = 20, seed = 42)
+    print('Asian:', asian.calc_price_and_greeks(option_call, payoff = asian_payoff))
+
+    # randomized QMC against pseudo-random paths with the same budget
+    for payoff, num_steps in ((vanilla_payoff, 1), (asian_payoff, 16)):
+        for mode in (MonteCarloModel.PLAIN, MonteCarloModel.QMC):
+            mc_model = MonteCarloModel(pricing_date, r, num_paths = 2 ** 16, num_steps = num_steps,
+                                       variance_reduction = mode, seed = 42)
+            print(f"{payoff.__name__} {mode}:", mc_model.calc_model_price(option_call, payoff = payoff))
+
+
+if __name__ == "__main__":
+    _test()
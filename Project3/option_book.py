@@ -0,0 +1,163 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Columnar Option Book
+
+'''
+
+import datetime
+import numpy as np
+
+from stock import Stock
+from financial_option import *
+from blackscholes_model import BlackScholesModel, OptionArrays
+
+
+class OptionBook(object):
+    '''
+    Struct-of-arrays container for a large number of option contracts
+
+    Contracts are stored as contiguous columns: option_type and option_style as int8 codes, strike and
+    time_to_expiry as float64 and underlying_id as int32, an index into the underlyings list.
+    Market data is kept per underlying in the spot, sigma and dividend_yield arrays (refresh_market reloads
+    them from the Stock objects), so a contract costs 22 bytes instead of a Python object.
+
+    book[a:b] returns a view sharing the columns, a boolean mask or index array gathers the selected rows.
+    Every pricing model accepting a list of FinancialOption objects also accepts an OptionBook
+    '''
+
+    CALL, PUT = 0, 1
+    EUROPEAN, AMERICAN = 0, 1
+
+    _type_codes = {FinancialOption.Type.CALL: CALL, FinancialOption.Type.PUT: PUT}
+    _style_codes = {FinancialOption.Style.EUROPEAN: EUROPEAN, FinancialOption.Style.AMERICAN: AMERICAN}
+    _option_classes = {(CALL, EUROPEAN): EuropeanCallOption, (PUT, EUROPEAN): EuropeanPutOption,
+                       (CALL, AMERICAN): AmericanCallOption, (PUT, AMERICAN): AmericanPutOption}
+
+    def __init__(self, option_type, option_style, strike, time_to_expiry, underlying_id, underlyings = None,
+                 spot = None, sigma = None, dividend_yield = None):
+        self.option_type = np.asarray(option_type, dtype = np.int8)
+        self.option_style = np.asarray(option_style, dtype = np.int8)
+        self.strike = np.asarray(strike, dtype = np.float64)
+        self.time_to_expiry = np.asarray(time_to_expiry, dtype = np.float64)
+        self.underlying_id = np.asarray(underlying_id, dtype = np.int32)
+
+        self.underlyings = underlyings
+        if spot is None:
+            self.refresh_market()
+        else:
+            self.spot = np.asarray(spot, dtype = np.float64)
+            self.sigma = np.asarray(sigma, dtype = np.float64)
+            self.dividend_yield = np.zeros_like(self.spot) if dividend_yield is None else \
+                np.asarray(dividend_yield, dtype = np.float64)
+
+    @classmethod
+    def from_options(cls, options):
+        '''
+        build a book from a list of FinancialOption objects, underlyings are deduplicated by identity
+        '''
+        underlyings = []
+        ids = {}
+        underlying_id = np.empty(len(options), dtype = np.int32)
+        for i, o in enumerate(options):
+            key = id(o.underlying)
+            if key not in ids:
+                ids[key] = len(underlyings)
+                underlyings.append(o.underlying)
+            underlying_id[i] = ids[key]
+
+        return cls(option_type = [cls._type_codes[o.option_type] for o in options],
+                   option_style = [cls._style_codes[o.option_style] for o in options],
+                   strike = [o.strike for o in options],
+                   time_to_expiry = [o.time_to_expiry for o in options],
+                   underlying_id = underlying_id, underlyings = underlyings)
+
+    def to_options(self):
+        '''
+        convert back into a list of FinancialOption objects
+        '''
+        if self.underlyings is None:
+            raise Exception("OptionBook has no underlying Stock objects to build options from")
+        return [OptionBook._option_classes[(t, s)](self.underlyings[u], T, K)
+                for t, s, K, T, u in zip(self.option_type.tolist(), self.option_style.tolist(), self.strike.tolist(),
+                                         self.time_to_expiry.tolist(), self.underlying_id.tolist())]
+
+    def refresh_market(self):
+        # reload spot, sigma and dividend_yield from the underlying Stock objects
+        if self.underlyings is None:
+            raise Exception("OptionBook has no underlying Stock objects to read market data from")
+        self.spot = np.array([u.spot_price for u in self.underlyings], dtype = np.float64)
+        self.sigma = np.array([u.sigma for u in self.underlyings], dtype = np.float64)
+        self.dividend_yield = np.array([u.dividend_yield for u in self.underlyings], dtype = np.float64)
+
+    def __len__(self):
+        return self.strike.shape[0]
+
+    def __getitem__(self, key):
+        # slices give views of the columns, masks and index arrays gather; the underlying table is always shared
+        return OptionBook(self.option_type[key], self.option_style[key], self.strike[key], self.time_to_expiry[key],
+                          self.underlying_id[key], self.underlyings, self.spot, self.sigma, self.dividend_yield)
+
+    @property
+    def is_call(self):
+        return self.option_type == OptionBook.CALL
+
+    @property
+    def is_american(self):
+        return self.option_style == OptionBook.AMERICAN
+
+    @property
+    def nbytes(self):
+        return sum(x.nbytes for x in (self.option_type, self.option_style, self.strike, self.time_to_expiry,
+                                      self.underlying_id))
+
+    def option_arrays(self):
+        '''
+        per-contract pricing inputs, the market data is gathered through underlying_id
+        '''
+        return OptionArrays(spot = self.spot[self.underlying_id], strike = self.strike,
+                            time_to_expiry = self.time_to_expiry, sigma = self.sigma[self.underlying_id],
+                            dividend_yield = self.dividend_yield[self.underlying_id],
+                            is_call = self.is_call, is_american = self.is_american,
+                            underlying_id = self.underlying_id, underlyings = self.underlyings)
+
+
+def _test():
+    import time
+    import tracemalloc
+
+    pricing_date = datetime.date(2023, 12, 8)
+    bs_model = BlackScholesModel(pricing_date, 0.05)
+
+    stocks = [Stock(None, None, 'AAPL', spot_price = 190, sigma = 0.25),
+              Stock(None, None, 'MSFT', spot_price = 370, sigma = 0.22, dividend_yield = 0.008)]
+    options = [EuropeanCallOption(stocks[0], 0.5, 180), EuropeanPutOption(stocks[1], 0.25, 380),
+               AmericanPutOption(stocks[0], 1.0, 200)]
+    book = OptionBook.from_options(options)
+    print('Round trip:', [(type(o).__name__, o.underlying.ticker, o.strike) for o in book.to_options()])
+    print('Book prices:', bs_model.calc_model_price_batch(book[:2]))
+
+    # one million contracts over 500 underlyings
+    n = 1000000
+    rng = np.random.default_rng(0)
+    tracemalloc.start()
+    big = OptionBook(option_type = rng.integers(0, 2, n), option_style = np.zeros(n), strike = rng.uniform(50, 150, n),
+                     time_to_expiry = rng.uniform(0.05, 2.0, n), underlying_id = rng.integers(0, 500, n),
+                     spot = rng.uniform(80, 120, 500), sigma = rng.uniform(0.1, 0.5, 500))
+    print(f"Columns use {big.nbytes / 1024 ** 2:.1f} MB, peak {tracemalloc.get_traced_memory()[1] / 1024 ** 2:.1f} MB")
+    tracemalloc.stop()
+
+    start = time.time()
+    px = bs_model.calc_model_price_batch(big)
+    print(f"Priced {n} contracts in {time.time() - start:.3f} seconds")
+    calls = big[big.is_call]
+    print('Calls:', len(calls), 'Slice shares memory:', np.shares_memory(big[10:20].strike, big.strike))
+
+
+if __name__ == "__main__":
+    _test()
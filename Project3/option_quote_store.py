@@ -0,0 +1,194 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Option chain storage in the SQLite database
+
+'''
+
+import os
+import time
+import datetime
+import sqlite3
+import numpy as np
+import pandas as pd
+
+import option
+from stock import Stock
+from option_book import OptionBook
+from daycount import year_fraction, ACT_365
+
+
+class OptionQuoteStore(object):
+    '''
+    End of day option quotes in the OptionDailyQuote table next to EquityDailyPrice
+
+    The table is WITHOUT ROWID with the primary key (Underlying, AsOfDate, Expiry, Strike, OptionType), so the rows
+    are stored clustered in key order and one underlying-date chain is a contiguous range of the key.
+    Dates are stored as YYYY-MM-DD text and OptionType as 'C' or 'P'
+    '''
+
+    DB_TABLE = 'OptionDailyQuote'
+    COLUMNS = ['Underlying', 'AsOfDate', 'Expiry', 'Strike', 'OptionType', 'Bid', 'Ask', 'Last', 'Volume',
+               'OpenInterest', 'ImpliedVol']
+
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def create_table(self):
+        sql = f"""CREATE TABLE IF NOT EXISTS {OptionQuoteStore.DB_TABLE} (
+                    Underlying TEXT NOT NULL,
+                    AsOfDate TEXT NOT NULL,
+                    Expiry TEXT NOT NULL,
+                    Strike REAL NOT NULL,
+                    OptionType TEXT NOT NULL,
+                    Bid REAL,
+                    Ask REAL,
+                    Last REAL,
+                    Volume INTEGER,
+                    OpenInterest INTEGER,
+                    ImpliedVol REAL,
+                    PRIMARY KEY (Underlying, AsOfDate, Expiry, Strike, OptionType)
+                  ) WITHOUT ROWID"""
+        self.db_connection.execute(sql)
+        self.db_connection.commit()
+
+    def csv_to_table(self, csv_file_name, fields_map = None, batch_size = 100000):
+        '''
+        stream a chain file into the table in chunks of batch_size rows, one transaction per chunk.
+        fields_map renames the file columns to the table columns, missing optional columns are stored as NULL
+        and rows already in the table are replaced. Returns the number of rows loaded
+        '''
+        insert_sql = f"INSERT OR REPLACE INTO {OptionQuoteStore.DB_TABLE} ({', '.join(OptionQuoteStore.COLUMNS)}) " \
+                     f"VALUES ({', '.join(['?'] * len(OptionQuoteStore.COLUMNS))})"
+        cursor = self.db_connection.cursor()
+        num_rows = 0
+        for df in pd.read_csv(csv_file_name, chunksize = batch_size):
+            if fields_map is not None:
+                df = df.rename(columns = fields_map)
+            df = _normalize_quotes(df)
+            # inserting in key order keeps the B-tree appends local
+            df = df.sort_values(OptionQuoteStore.COLUMNS[:5], kind = 'stable')
+            rows = df[OptionQuoteStore.COLUMNS].astype(object).where(df[OptionQuoteStore.COLUMNS].notna(), None)
+            # the connection opens the transaction itself (or joins one already open) and commits the chunk
+            with self.db_connection:
+                cursor.executemany(insert_sql, rows.itertuples(index = False, name = None))
+            num_rows += len(df)
+        cursor.close()
+        return num_rows
+
+    def read_chain(self, underlying, as_of_date):
+        '''
+        all quotes of one underlying on one date in key order, as a DataFrame. The query is a range scan
+        on the leading columns of the primary key
+        '''
+        sql = f"SELECT {', '.join(OptionQuoteStore.COLUMNS)} FROM {OptionQuoteStore.DB_TABLE} " \
+              f"WHERE Underlying = ? AND AsOfDate = ?"
+        cursor = self.db_connection.execute(sql, (underlying, str(as_of_date)[:10]))
+        rows = cursor.fetchall()
+        return pd.DataFrame.from_records(rows, columns = OptionQuoteStore.COLUMNS)
+
+    def read_chain_arrays(self, underlying, as_of_date, convention = ACT_365):
+        '''
+        the chain as numpy column arrays ready for the batch pricing inputs: strike, time_to_expiry (from
+        as_of_date in the day count convention), is_call, bid, ask and mid. Reads only the pricing columns
+        '''
+        sql = f"SELECT Expiry, Strike, OptionType, Bid, Ask FROM {OptionQuoteStore.DB_TABLE} " \
+              f"WHERE Underlying = ? AND AsOfDate = ?"
+        rows = self.db_connection.execute(sql, (underlying, str(as_of_date)[:10])).fetchall()
+        if not rows:
+            empty = np.empty(0)
+            return {'strike': empty, 'time_to_expiry': empty, 'is_call': np.empty(0, dtype = bool),
+                    'bid': empty, 'ask': empty, 'mid': empty}
+        expiry, strike, option_type, bid, ask = zip(*rows)
+        bid = np.array(bid, dtype = float)
+        ask = np.array(ask, dtype = float)
+        return {'strike': np.array(strike, dtype = float),
+                'time_to_expiry': year_fraction(as_of_date, np.array(expiry, dtype = 'datetime64[D]'), convention),
+                'is_call': np.array(option_type) == 'C', 'bid': bid, 'ask': ask, 'mid': (bid + ask) / 2}
+
+    def read_option_book(self, stock, as_of_date, option_style = OptionBook.EUROPEAN, convention = ACT_365):
+        '''
+        the chain of a Stock as an OptionBook priced off the Stock market data, with the mid quotes
+        '''
+        arrays = self.read_chain_arrays(stock.ticker, as_of_date, convention)
+        n = arrays['strike'].shape[0]
+        book = OptionBook(option_type = np.where(arrays['is_call'], OptionBook.CALL, OptionBook.PUT),
+                          option_style = np.full(n, option_style), strike = arrays['strike'],
+                          time_to_expiry = arrays['time_to_expiry'], underlying_id = np.zeros(n), underlyings = [stock])
+        return book, arrays['mid']
+
+
+def _normalize_quotes(df):
+    # table column types, dates as YYYY-MM-DD and the option type as C or P
+    df = df.copy()
+    for c in OptionQuoteStore.COLUMNS:
+        if c not in df.columns:
+            df[c] = np.nan
+    df['AsOfDate'] = df['AsOfDate'].astype(str).str[:10]
+    df['Expiry'] = df['Expiry'].astype(str).str[:10]
+    df['OptionType'] = df['OptionType'].astype(str).str[0].str.upper()
+    return df
+
+
+def _test():
+    import tempfile
+    from blackscholes_model import BlackScholesModel
+
+    parser = option.get_default_parser()
+    parser.add_argument('--data_dir', dest = 'data_dir', default = './data', help = 'data dir')
+    args = parser.parse_args()
+    opt = option.Option(args = args)
+
+    # a synthetic end of day file: 200 underlyings x 20 dates x 6 expiries x 21 strikes x call/put
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range('2023-11-01', periods = 20)
+    tickers = [f"SYN{i:03d}" for i in range(200)]
+    expiries = pd.to_datetime(['2023-12-15', '2024-01-19', '2024-02-16', '2024-03-15', '2024-06-21', '2024-12-20'])
+    u, d, e, k, c = [x.ravel() for x in np.meshgrid(np.arange(len(tickers)), np.arange(len(dates)),
+                                                     np.arange(len(expiries)), np.arange(21), np.arange(2),
+                                                     indexing = 'ij')]
+    mid = rng.uniform(0.1, 20, len(u))
+    chain = pd.DataFrame({'underlying': np.array(tickers)[u], 'quote_date': dates[d].strftime('%Y-%m-%d'),
+                          'expiration': expiries[e].strftime('%Y-%m-%d'), 'strike': 50.0 + 5 * k,
+                          'option_type': np.where(c == 0, 'call', 'put'),
+                          'bid': mid * 0.98, 'ask': mid * 1.02, 'volume': rng.integers(0, 1000, len(u))})
+    fields_map = {'underlying': 'Underlying', 'quote_date': 'AsOfDate', 'expiration': 'Expiry', 'strike': 'Strike',
+                  'option_type': 'OptionType', 'bid': 'Bid', 'ask': 'Ask', 'volume': 'Volume'}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'chains.csv')
+        chain.sample(frac = 1, random_state = 0).to_csv(csv_file, index = False)
+        db_connection = sqlite3.connect(os.path.join(tmp, 'Equity.db'))
+        store = OptionQuoteStore(db_connection)
+        store.create_table()
+        # a statement left open on the connection must not stop the bulk load
+        db_connection.execute(f"DELETE FROM {OptionQuoteStore.DB_TABLE} WHERE Underlying = 'NONE'")
+
+        start = time.time()
+        num_rows = store.csv_to_table(csv_file, fields_map)
+        elapsed = time.time() - start
+        print(f"Loaded {num_rows} quotes in {elapsed:.2f}s ({num_rows / elapsed:,.0f} rows/sec)")
+
+        plan = db_connection.execute(f"EXPLAIN QUERY PLAN SELECT * FROM {OptionQuoteStore.DB_TABLE} "
+                                     f"WHERE Underlying = ? AND AsOfDate = ?", ('SYN042', '2023-11-15')).fetchall()
+        print('Query plan:', plan[0][-1])
+
+        start = time.time()
+        arrays = store.read_chain_arrays('SYN042', datetime.date(2023, 11, 15))
+        print(f"Read {arrays['strike'].shape[0]} quotes in {(time.time() - start) * 1000:.2f} ms")
+
+        stock = Stock(opt, db_connection, 'SYN042', spot_price = 100, sigma = 0.3)
+        book, mid = store.read_option_book(stock, datetime.date(2023, 11, 15))
+        bs_model = BlackScholesModel(datetime.date(2023, 11, 15), 0.05)
+        print('Model - mid:', (bs_model.calc_model_price_batch(book) - mid)[:5])
+        print(store.read_chain('SYN042', '2023-11-15').head())
+        db_connection.close()
+
+
+if __name__ == "__main__":
+    _test()
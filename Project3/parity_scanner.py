@@ -0,0 +1,169 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Put-Call Parity and Box Spread Scanner
+
+'''
+
+import datetime
+import numpy as np
+import pandas as pd
+
+from blackscholes_model import BlackScholesModel
+
+
+class CostModel(object):
+    '''
+    trading costs per share of underlying: option commissions are charged per contract of multiplier shares,
+    stock trades pay stock_cost_bps of the notional and short stock pays borrow_rate over the life of the trade
+    '''
+    def __init__(self, commission_per_contract = 0.65, multiplier = 100, stock_cost_bps = 1.0, borrow_rate = 0.0):
+        self.commission_per_contract = commission_per_contract
+        self.multiplier = multiplier
+        self.stock_cost_bps = stock_cost_bps
+        self.borrow_rate = borrow_rate
+
+    def option_legs(self, num_legs):
+        return num_legs * self.commission_per_contract / self.multiplier
+
+    def stock_leg(self, spot, time_to_expiry, short = False):
+        cost = spot * self.stock_cost_bps / 10000
+        return cost + spot * self.borrow_rate * time_to_expiry if short else cost
+
+
+class ParityScanner(object):
+    '''
+    Scan whole option chains for put-call parity and box spread violations
+
+    The chain is a DataFrame with one row per (Underlying, TimeToExpiry, Strike) and the columns
+    CallBid, CallAsk, PutBid, PutAsk, SpotBid, SpotAsk (or a single Spot) and optionally DividendYield.
+    Every check is computed on whole columns at once, prices are executable (buy at the ask, sell at the bid),
+    edges are present values per share net of the cost model and discounted at the model risk_free_rate.
+
+    conversion : sell call, buy put, buy stock, locks in K at expiry
+    reversal   : buy call, sell put, short stock
+    long_box   : buy the K1/K2 call spread and the K2/K1 put spread, receives K2 - K1 at expiry
+    short_box  : the opposite of the long box
+    Box spreads pair strikes up to max_strike_gap positions apart within each underlying and expiry
+    '''
+
+    def __init__(self, model, cost_model = None, max_strike_gap = None):
+        self.model = model
+        self.cost_model = CostModel() if cost_model is None else cost_model
+        self.max_strike_gap = max_strike_gap
+
+    def scan(self, chain, min_edge = 0.0):
+        '''
+        return a DataFrame of the candidates with an edge above min_edge, ranked by edge
+        '''
+        chain = chain.sort_values(['Underlying', 'TimeToExpiry', 'Strike'], kind = 'stable').reset_index(drop = True)
+        candidates = pd.concat([self.parity_violations(chain, min_edge), self.box_violations(chain, min_edge)],
+                               ignore_index = True)
+        return candidates.sort_values('Edge', ascending = False, kind = 'stable').reset_index(drop = True)
+
+    def parity_violations(self, chain, min_edge = -np.inf):
+        # conversion and reversal edge of every row, only the rows above min_edge are kept
+        r = self.model.risk_free_rate
+        costs = self.cost_model
+        T = chain['TimeToExpiry'].values
+        K = chain['Strike'].values
+        q = chain['DividendYield'].values if 'DividendYield' in chain else 0.0
+        spot_bid, spot_ask = _spot_quotes(chain)
+        carry = np.exp(-q * T)
+        pv_strike = K * np.exp(-r * T)
+
+        conversion = chain['CallBid'].values - chain['PutAsk'].values - spot_ask * carry + pv_strike \
+            - costs.option_legs(2) - costs.stock_leg(spot_ask, T)
+        reversal = chain['PutBid'].values - chain['CallAsk'].values + spot_bid * carry - pv_strike \
+            - costs.option_legs(2) - costs.stock_leg(spot_bid, T, short = True)
+
+        frames = []
+        for strategy, edge in (('conversion', conversion), ('reversal', reversal)):
+            idx = np.flatnonzero(edge > min_edge)
+            frames.append(pd.DataFrame({'Strategy': strategy, 'Underlying': chain['Underlying'].values[idx],
+                                        'TimeToExpiry': T[idx], 'Strike': K[idx], 'Strike2': np.nan,
+                                        'Edge': edge[idx]}))
+        return pd.concat(frames, ignore_index = True)
+
+    def box_violations(self, chain, min_edge = -np.inf):
+        # long and short box edge of every strike pair, one vectorized pass per gap between sorted strikes.
+        # The chain must be sorted by underlying, expiry and strike
+        r = self.model.risk_free_rate
+        costs = self.cost_model
+        group = chain.groupby(['Underlying', 'TimeToExpiry'], sort = False).ngroup().values
+        n = len(chain)
+        max_gap = n - 1 if self.max_strike_gap is None else min(self.max_strike_gap, n - 1)
+        T = chain['TimeToExpiry'].values
+        K = chain['Strike'].values
+        call_bid, call_ask = chain['CallBid'].values, chain['CallAsk'].values
+        put_bid, put_ask = chain['PutBid'].values, chain['PutAsk'].values
+        underlying = chain['Underlying'].values
+
+        frames = []
+        for gap in range(1, max_gap + 1):
+            lo = np.flatnonzero(group[:-gap] == group[gap:])
+            if lo.size == 0:
+                break
+            hi = lo + gap
+            pv_width = (K[hi] - K[lo]) * np.exp(-r * T[lo])
+            long_box = pv_width - (call_ask[lo] - call_bid[hi] + put_ask[hi] - put_bid[lo]) - costs.option_legs(4)
+            short_box = (call_bid[lo] - call_ask[hi] + put_bid[hi] - put_ask[lo]) - pv_width - costs.option_legs(4)
+            for strategy, edge in (('long_box', long_box), ('short_box', short_box)):
+                keep = edge > min_edge
+                frames.append(pd.DataFrame({'Strategy': strategy, 'Underlying': underlying[lo[keep]],
+                                            'TimeToExpiry': T[lo[keep]], 'Strike': K[lo[keep]],
+                                            'Strike2': K[hi[keep]], 'Edge': edge[keep]}))
+        if not frames:
+            return pd.DataFrame(columns = ['Strategy', 'Underlying', 'TimeToExpiry', 'Strike', 'Strike2', 'Edge'])
+        return pd.concat(frames, ignore_index = True)
+
+
+def _spot_quotes(chain):
+    if 'SpotBid' in chain:
+        return chain['SpotBid'].values, chain['SpotAsk'].values
+    return chain['Spot'].values, chain['Spot'].values
+
+
+def _test():
+    import time
+
+    pricing_date = datetime.date(2023, 12, 8)
+    r = 0.05
+    bs_model = BlackScholesModel(pricing_date, r)
+
+    # end of day snapshot: 500 underlyings, 8 expiries, 40 strikes, quotes around the B\S value
+    rng = np.random.default_rng(0)
+    num_underlyings, expiries, num_strikes = 500, np.array([1, 2, 3, 6, 9, 12, 18, 24]) / 12, 40
+    spot = rng.uniform(20, 500, num_underlyings)
+    sigma = rng.uniform(0.15, 0.6, num_underlyings)
+    u, e, s = [x.ravel() for x in np.meshgrid(np.arange(num_underlyings), np.arange(len(expiries)),
+                                               np.arange(num_strikes), indexing = 'ij')]
+    K = np.round(spot[u] * np.linspace(0.6, 1.4, num_strikes)[s], 1)
+    T = expiries[e]
+    call = bs_model.calc_model_price_batch(spot[u], K, T, sigma[u], 0.0, True)
+    put = bs_model.calc_model_price_batch(spot[u], K, T, sigma[u], 0.0, False)
+    half_spread = 0.01 + 0.02 * np.maximum(call, put) * rng.random(len(K))
+    chain = pd.DataFrame({'Underlying': np.array([f"SYN{i:03d}" for i in range(num_underlyings)])[u],
+                          'TimeToExpiry': T, 'Strike': K,
+                          'CallBid': np.maximum(call - half_spread, 0), 'CallAsk': call + half_spread,
+                          'PutBid': np.maximum(put - half_spread, 0), 'PutAsk': put + half_spread,
+                          'SpotBid': spot[u] - 0.01, 'SpotAsk': spot[u] + 0.01})
+    # a few mispriced quotes
+    bad = rng.choice(len(chain), 5, replace = False)
+    chain.loc[bad, ['CallBid', 'CallAsk']] += 2.0
+
+    scanner = ParityScanner(bs_model, max_strike_gap = 10)
+    start = time.time()
+    candidates = scanner.scan(chain)
+    print(f"Scanned {len(chain)} strikes in {time.time() - start:.2f}s, {len(candidates)} candidates")
+    print(candidates.head(10))
+    print('Injected at strikes:', sorted(chain.loc[bad, 'Strike'].tolist()))
+
+
+if __name__ == "__main__":
+    _test()
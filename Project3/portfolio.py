@@ -0,0 +1,177 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Option Portfolio with incremental Greeks aggregation
+
+'''
+
+import datetime
+import numpy as np
+from numpy.lib import recfunctions
+
+from stock import Stock
+from financial_option import *
+from blackscholes_model import BlackScholesModel, GREEKS_DTYPE, option_arrays
+
+
+class OptionPortfolio(object):
+    '''
+    Book of FinancialOption positions with per-position, per-underlying and net Greeks kept in arrays
+
+    Positions are sorted by underlying so each underlying owns one contiguous slice of the arrays.
+    A spot tick on one underlying reprices only that slice and moves the aggregates by the change in its exposure
+    '''
+
+    def __init__(self, model):
+        self.model = model
+        self._options = []
+        self._quantities = []
+        self._dirty = True
+
+    def add_position(self, option, quantity):
+        self._options.append(option)
+        self._quantities.append(quantity)
+        self._dirty = True
+
+    @property
+    def tickers(self):
+        self._build()
+        return list(self._tickers)
+
+    @property
+    def position_greeks(self):
+        # quantity weighted price and Greeks of every position, in the order they were added
+        self._build()
+        exposure = np.empty_like(self._exposure)
+        exposure[self._order] = self._exposure
+        return recfunctions.unstructured_to_structured(exposure, dtype = GREEKS_DTYPE)
+
+    @property
+    def net_greeks(self):
+        self._build()
+        return recfunctions.unstructured_to_structured(self._net, dtype = GREEKS_DTYPE)
+
+    def underlying_greeks(self, ticker):
+        self._build()
+        return recfunctions.unstructured_to_structured(self._by_underlying[self._ticker_index[ticker]],
+                                                       dtype = GREEKS_DTYPE)
+
+    def on_spot_tick(self, ticker, spot_price):
+        '''
+        move the spot of one underlying, reprice its positions and update the aggregates by delta
+        '''
+        self._build()
+        stock = self._stocks[self._ticker_index[ticker]]
+        stock.spot_price = spot_price
+        self._reprice(ticker)
+
+    def refresh(self, ticker = None):
+        '''
+        reprice one underlying (or the whole book) from the current spot_price, sigma and dividend_yield
+        of the Stock objects and the model volatility surfaces, e.g. after a vol change
+        '''
+        self._build()
+        if ticker is None:
+            for t in self._tickers:
+                self._reprice(t)
+        else:
+            self._reprice(ticker)
+
+    def _reprice(self, ticker):
+        i = self._ticker_index[ticker]
+        stock = self._stocks[i]
+        s = self._slices[i]
+        # the same volatility the model prices single options with, from its surface for the ticker when set
+        surface = getattr(self.model, 'vol_surfaces', {}).get(ticker)
+        sigma = stock.sigma if surface is None else surface.vol(self._strike[s], self._time_to_expiry[s])
+        greeks = self.model.calc_price_and_greeks(stock.spot_price, self._strike[s], self._time_to_expiry[s],
+                                                  sigma, stock.dividend_yield, self._is_call[s])
+        exposure = recfunctions.structured_to_unstructured(greeks) * self._quantity[s, None]
+        self._exposure[s] = exposure
+
+        total = exposure.sum(axis = 0)
+        self._net += total - self._by_underlying[i]
+        self._by_underlying[i] = total
+
+    def _build(self):
+        # lay the positions out by underlying and price the whole book once
+        if not self._dirty:
+            return
+
+        arrays = option_arrays(self._options)
+        if arrays.is_american.any():
+            raise Exception("B\S price for American option not implemented yet")
+
+        tickers = np.array([o.underlying.ticker for o in self._options])
+        order = np.argsort(tickers, kind = 'stable')
+        self._tickers, starts = np.unique(tickers[order], return_index = True)
+        stops = np.append(starts[1:], len(order))
+        self._ticker_index = {t: i for i, t in enumerate(self._tickers)}
+        self._slices = [slice(a, b) for a, b in zip(starts, stops)]
+        self._stocks = [self._options[order[a]].underlying for a in starts]
+
+        self._order = order
+        self._strike = arrays.strike[order]
+        self._time_to_expiry = arrays.time_to_expiry[order]
+        self._is_call = arrays.is_call[order]
+        self._quantity = np.asarray(self._quantities, dtype = float)[order]
+
+        n_fields = len(GREEKS_DTYPE.names)
+        self._exposure = np.zeros((len(order), n_fields))
+        self._by_underlying = np.zeros((len(self._tickers), n_fields))
+        self._net = np.zeros(n_fields)
+        self._dirty = False
+        for t in self._tickers:
+            self._reprice(t)
+
+
+def _test():
+    import time
+
+    pricing_date = datetime.date(2023, 12, 8)
+    bs_model = BlackScholesModel(pricing_date, 0.05)
+    rng = np.random.default_rng(0)
+
+    # 200 underlyings with 25 positions each
+    book = OptionPortfolio(bs_model)
+    stocks = [Stock(None, None, f"T{i:03d}", spot_price = rng.uniform(20, 200), sigma = rng.uniform(0.1, 0.6))
+              for i in range(200)]
+    for stock in stocks:
+        for _ in range(25):
+            cls = EuropeanCallOption if rng.random() < 0.5 else EuropeanPutOption
+            book.add_position(cls(stock, rng.uniform(0.05, 2.0), stock.spot_price * rng.uniform(0.7, 1.3)),
+                              rng.integers(-100, 100))
+
+    start = time.time()
+    print('Net Greeks:', book.net_greeks)
+    print(f"Full build {time.time() - start:.4f} seconds")
+
+    start = time.time()
+    for _ in range(1000):
+        stock = stocks[rng.integers(200)]
+        book.on_spot_tick(stock.ticker, stock.spot_price * (1 + rng.normal(0, 0.001)))
+    print(f"Incremental re-risk {(time.time() - start) / 1000 * 1e3:.4f} ms per tick")
+
+    incremental = book.net_greeks
+    book.refresh()
+    print('Incremental vs full refresh:', incremental, book.net_greeks)
+
+    # a volatility surface set on the model is picked up after a refresh
+    from vol_surface import VolatilitySurface
+    stock = stocks[0]
+    k_grid, T_grid = np.linspace(-1, 1, 21), np.linspace(0.05, 2.0, 11)
+    skew = (0.3 - 0.1 * k_grid)[None, :] ** 2 * T_grid[:, None]
+    bs_model.set_vol_surface(stock.ticker, VolatilitySurface(stock.spot_price, 0.05, 0.0, k_grid, T_grid, skew))
+    book.refresh(stock.ticker)
+    positions = [i for i, o in enumerate(book._options) if o.underlying is stock]
+    model_px = np.array([bs_model.calc_model_price(book._options[i]) * book._quantities[i] for i in positions])
+    print('Surface prices vs calc_model_price:', np.abs(book.position_greeks['price'][positions] - model_px).max())
+
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,192 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Pricing Cache for the Black-Schole Model
+
+'''
+
+import datetime
+from collections import OrderedDict
+
+from stock import Stock
+from financial_option import *
+from blackscholes_model import BlackScholesModel
+
+
+class PricingCache(object):
+    '''
+    Memoize BlackScholesModel prices and Greeks in a bounded LRU
+
+    Entries are keyed on (spot, strike, time_to_expiry, risk_free_rate, dividend_yield, sigma, type, style).
+    tolerance maps any of 'spot', 'strike', 'time_to_expiry', 'risk_free_rate', 'dividend_yield', 'sigma'
+    to a bucket width, inputs that fall in the same bucket share one entry. Inputs without a width are matched exactly.
+
+    Each entry holds the full price and Greeks record, so one miss serves every calc_* method.
+    The cache remembers the spot_price, sigma and dividend_yield each underlying had when its entries were made,
+    the volatility surface the model held for it, and the model risk_free_rate; when any of them has moved
+    to another bucket (or the surface was set or replaced) the affected entries are dropped on the next lookup
+    '''
+
+    _fields = ('spot', 'strike', 'time_to_expiry', 'risk_free_rate', 'dividend_yield', 'sigma')
+
+    def __init__(self, model, maxsize = 100000, tolerance = None):
+        self.model = model
+        self.maxsize = maxsize
+        self.tolerance = dict(tolerance) if tolerance is not None else {}
+        for k in self.tolerance:
+            if k not in PricingCache._fields:
+                raise Exception(f"Unknown tolerance field {k}")
+
+        self._entries = OrderedDict()
+        self._keys_by_ticker = {}
+        self._market_by_ticker = {}
+        self._risk_free_rate = self._bucket('risk_free_rate', model.risk_free_rate)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def calc_price_and_greeks(self, option):
+        '''
+        return the cached GREEKS_DTYPE record for the option, pricing it on a miss
+        '''
+        self._check_market(option.underlying)
+        key = self._make_key(option)
+        record = self._entries.get(key)
+        if record is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return(record[0])
+
+        self.misses += 1
+        result = self.model.calc_price_and_greeks(option)
+        ticker = option.underlying.ticker
+        self._entries[key] = (result, ticker)
+        self._keys_by_ticker.setdefault(ticker, set()).add(key)
+        if len(self._entries) > self.maxsize:
+            old_key, (_, old_ticker) = self._entries.popitem(last = False)
+            self._keys_by_ticker[old_ticker].discard(old_key)
+            self.evictions += 1
+        return(result)
+
+    def calc_model_price(self, option):
+        return(float(self.calc_price_and_greeks(option)['price']))
+
+    def calc_delta(self, option):
+        return(float(self.calc_price_and_greeks(option)['delta']))
+
+    def calc_gamma(self, option):
+        return(float(self.calc_price_and_greeks(option)['gamma']))
+
+    def calc_theta(self, option):
+        return(float(self.calc_price_and_greeks(option)['theta']))
+
+    def calc_vega(self, option):
+        return(float(self.calc_price_and_greeks(option)['vega']))
+
+    def calc_rho(self, option):
+        return(float(self.calc_price_and_greeks(option)['rho']))
+
+    def invalidate(self, ticker = None):
+        '''
+        drop the entries of one underlying, or everything when ticker is None
+        '''
+        if ticker is None:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_ticker.clear()
+            self._market_by_ticker.clear()
+            return
+
+        for key in self._keys_by_ticker.pop(ticker, ()):
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+        self._market_by_ticker.pop(ticker, None)
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'invalidations': self.invalidations}
+
+    def _check_market(self, underlying):
+        # drop stale entries when the model rate or this underlying's market data moved since they were cached
+        rate = self._bucket('risk_free_rate', self.model.risk_free_rate)
+        if rate != self._risk_free_rate:
+            self.invalidate()
+            self._risk_free_rate = rate
+
+        # compared bucketed, so moves inside the tolerance keep the entries. The surface is compared by identity,
+        # a refit is a new VolatilitySurface object
+        surface = getattr(self.model, 'vol_surfaces', {}).get(underlying.ticker)
+        market = (self._bucket('spot', underlying.spot_price), self._bucket('sigma', underlying.sigma),
+                  self._bucket('dividend_yield', underlying.dividend_yield), surface)
+        cached = self._market_by_ticker.get(underlying.ticker)
+        if cached != market:
+            if cached is not None:
+                self.invalidate(underlying.ticker)
+            self._market_by_ticker[underlying.ticker] = market
+
+    def _bucket(self, field, value):
+        width = self.tolerance.get(field)
+        return round(value / width) if width else value
+
+    def _make_key(self, option):
+        underlying = option.underlying
+        return (self._bucket('spot', underlying.spot_price),
+                self._bucket('strike', option.strike),
+                self._bucket('time_to_expiry', option.time_to_expiry),
+                self._bucket('risk_free_rate', self.model.risk_free_rate),
+                self._bucket('dividend_yield', underlying.dividend_yield),
+                self._bucket('sigma', underlying.sigma),
+                option.option_type, option.option_style)
+
+
+def _test():
+    import time
+
+    pricing_date = datetime.date(2023, 12, 8)
+    bs_model = BlackScholesModel(pricing_date, 0.1)
+    cache = PricingCache(bs_model, maxsize = 1000, tolerance = {'spot': 0.01, 'time_to_expiry': 1 / 365})
+
+    stock = Stock(None, None, 'AAPL', spot_price = 42, sigma = 0.2)
+    chain = [EuropeanCallOption(stock, 0.5, k) for k in range(30, 55)] + \
+            [EuropeanPutOption(stock, 0.5, k) for k in range(30, 55)]
+
+    for _ in range(100):
+        for option in chain:
+            cache.calc_model_price(option)
+    print('After repeat queries:', cache.stats())
+
+    start = time.time()
+    for option in chain:
+        cache.calc_delta(option)
+    print(f"Cached lookup {(time.time() - start) / len(chain) * 1e6:.2f} us per option")
+
+    # a small spot move stays inside the bucket, a larger one invalidates AAPL
+    stock.spot_price = 42.001
+    cache.calc_model_price(chain[0])
+    stock.spot_price = 43
+    cache.calc_model_price(chain[0])
+    print('After spot move:', cache.stats())
+
+    bs_model.risk_free_rate = 0.05
+    print('Price after rate change:', cache.calc_model_price(chain[0]), bs_model.calc_model_price(chain[0]))
+    print('After rate change:', cache.stats())
+
+    # setting a volatility surface for AAPL drops its entries priced off Stock.sigma
+    from vol_surface import VolatilitySurface
+    import numpy as np
+    k_grid, T_grid = np.linspace(-1, 1, 21), np.linspace(0.05, 2.0, 11)
+    skew = (0.3 - 0.1 * k_grid)[None, :] ** 2 * T_grid[:, None]
+    bs_model.set_vol_surface('AAPL', VolatilitySurface(43, 0.05, 0.0, k_grid, T_grid, skew))
+    print('Price after surface set:', cache.calc_model_price(chain[0]), bs_model.calc_model_price(chain[0]))
+    print('After surface set:', cache.stats())
+
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,176 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Volatility Surface
+
+'''
+
+import datetime
+import numpy as np
+from scipy.optimize import least_squares
+from scipy.interpolate import UnivariateSpline
+
+from stock import Stock
+from financial_option import *
+from blackscholes_model import BlackScholesModel
+
+
+def svi_total_variance(k, a, b, rho, m, s):
+    # raw SVI total implied variance w(k) at log-moneyness k
+    return a + b * (rho * (k - m) + np.sqrt((k - m) ** 2 + s ** 2))
+
+def fit_svi_slice(k, w):
+    '''
+    least squares fit of the raw SVI parameters (a, b, rho, m, s) to the total variances w of one expiry
+    '''
+    x0 = [max(w.min() / 2, 1e-6), 0.1, -0.3, 0.0, 0.1]
+    bounds = ([-1.0, 0.0, -0.999, -2.0, 1e-4], [np.inf, 10.0, 0.999, 2.0, 5.0])
+    fit = least_squares(lambda p: svi_total_variance(k, *p) - w, x0, bounds = bounds)
+    return fit.x
+
+
+class VolatilitySurface(object):
+    '''
+    Implied volatility surface of one underlying, precomputed on a dense uniform grid
+
+    The grid holds the total variance w = sigma^2 T over log forward moneyness k = log(K / F(T)) and expiry.
+    Each quoted expiry is fitted on its own (SVI or a smoothing spline in k), the slices are then interpolated
+    linearly in total variance across expiries. vol() does a vectorized bilinear lookup in the grid, outside the
+    grid the smile is extended flat in k and the volatility is held flat in T.
+    The forward uses the spot and rates at fit time, so the surface is sticky strike until it is refitted
+    '''
+
+    SVI = 'svi'
+    SPLINE = 'spline'
+
+    def __init__(self, spot, risk_free_rate, dividend_yield, log_moneyness, expiries, total_variance):
+        self.spot = spot
+        self.risk_free_rate = risk_free_rate
+        self.dividend_yield = dividend_yield
+        self.log_moneyness = log_moneyness
+        self.expiries = expiries
+        self.total_variance = total_variance
+
+    @classmethod
+    def fit(cls, spot, strikes, expiries, implied_vols, risk_free_rate, dividend_yield = 0.0, method = 'svi',
+            num_moneyness = 401, num_expiries = 101, min_quotes = 5):
+        '''
+        fit the surface to arrays of quoted strikes, expiries and implied vols (nan vols are dropped,
+        expiries with fewer than min_quotes vols are skipped)
+        '''
+        if method not in (VolatilitySurface.SVI, VolatilitySurface.SPLINE):
+            raise Exception(f"Unsupported surface fit {method}")
+        strikes, expiries, implied_vols = [np.ravel(np.asarray(x, dtype = float)) for x in
+                                           (strikes, expiries, implied_vols)]
+        valid = np.isfinite(implied_vols) & (implied_vols > 0)
+        strikes, expiries, implied_vols = strikes[valid], expiries[valid], implied_vols[valid]
+
+        k = np.log(strikes / (spot * np.exp((risk_free_rate - dividend_yield) * expiries)))
+        w = implied_vols ** 2 * expiries
+        k_grid = np.linspace(k.min(), k.max(), num_moneyness)
+
+        slice_T, slice_w = [], []
+        for T in np.unique(expiries):
+            idx = expiries == T
+            if idx.sum() < min_quotes:
+                continue
+            order = np.argsort(k[idx])
+            k_T, w_T = k[idx][order], w[idx][order]
+            if method == VolatilitySurface.SVI:
+                slice_w.append(svi_total_variance(k_grid, *fit_svi_slice(k_T, w_T)))
+            else:
+                spline = UnivariateSpline(k_T, w_T, k = 3, s = len(k_T) * (1e-4 * w_T.mean()) ** 2)
+                slice_w.append(spline(np.clip(k_grid, k_T[0], k_T[-1])))
+            slice_T.append(T)
+        if not slice_T:
+            raise Exception("Not enough quotes to fit a volatility surface")
+        slice_T = np.array(slice_T)
+        slice_w = np.maximum(np.array(slice_w), 1e-10)
+
+        # linear in total variance between the fitted expiries
+        T_grid = np.linspace(slice_T[0], slice_T[-1], num_expiries) if len(slice_T) > 1 else slice_T
+        j = np.clip(np.searchsorted(slice_T, T_grid) - 1, 0, max(len(slice_T) - 2, 0))
+        if len(slice_T) > 1:
+            u = ((T_grid - slice_T[j]) / (slice_T[j + 1] - slice_T[j]))[:, None]
+            grid = (1 - u) * slice_w[j] + u * slice_w[j + 1]
+        else:
+            grid = slice_w
+        return cls(spot, risk_free_rate, dividend_yield, k_grid, T_grid, grid)
+
+    def vol(self, strike, time_to_expiry):
+        '''
+        implied volatility at arrays of strikes and expiries that broadcast together
+        '''
+        K, T = np.broadcast_arrays(np.asarray(strike, dtype = float), np.asarray(time_to_expiry, dtype = float))
+        k_grid, T_grid, grid = self.log_moneyness, self.expiries, self.total_variance
+        T_c = np.clip(T, T_grid[0], T_grid[-1])
+        k = np.log(K / (self.spot * np.exp((self.risk_free_rate - self.dividend_yield) * T)))
+
+        # fractional grid positions, the grid is uniform so no search is needed
+        x = _grid_position(k, k_grid)
+        y = _grid_position(T_c, T_grid)
+        i, j = x.astype(np.intp), y.astype(np.intp)
+        u, v = x - i, y - j
+        # gathers from the flattened grid, the last row and column are stepped back onto themselves
+        n = k_grid.shape[0]
+        flat = grid.ravel()
+        corner = j * n + i
+        di = np.where(i < n - 1, 1, 0)
+        dj = np.where(j < T_grid.shape[0] - 1, n, 0)
+        w = (1 - v) * ((1 - u) * flat.take(corner) + u * flat.take(corner + di)) + \
+            v * ((1 - u) * flat.take(corner + dj) + u * flat.take(corner + dj + di))
+        return np.sqrt(w / T_c)
+
+
+def _grid_position(x, grid):
+    # fractional index of x on a uniform grid, clipped to the grid
+    if grid.shape[0] == 1:
+        return np.zeros(np.shape(x))
+    return np.clip((x - grid[0]) / (grid[1] - grid[0]), 0, grid.shape[0] - 1)
+
+
+def _test():
+    import time
+    from implied_volatility import ImpliedVolatilitySolver
+
+    pricing_date = datetime.date(2023, 12, 8)
+    r, q, spot = 0.05, 0.01, 100.0
+    bs_model = BlackScholesModel(pricing_date, r)
+
+    # quotes from a known SVI surface, backed out through the implied vol solver
+    expiries = np.array([1, 2, 3, 6, 9, 12, 18, 24]) / 12
+    strikes = np.linspace(60, 150, 37)
+    K, T = [x.ravel() for x in np.meshgrid(strikes, expiries)]
+    k = np.log(K / (spot * np.exp((r - q) * T)))
+    true_vol = np.sqrt(svi_total_variance(k, 0.02 * T, 0.08 * np.sqrt(T), -0.6, 0.0, 0.2) / T)
+    market_price = bs_model.calc_model_price_batch(spot, K, T, true_vol, q, K > spot)
+    solved = ImpliedVolatilitySolver(bs_model).solve(market_price, spot, K, T, q, K > spot)
+
+    for method in (VolatilitySurface.SVI, VolatilitySurface.SPLINE):
+        start = time.time()
+        surface = VolatilitySurface.fit(spot, K, T, solved.implied_vol, r, q, method = method)
+        print(f"{method} fit in {time.time() - start:.3f}s, max error at the quotes "
+              f"{np.abs(surface.vol(K, T) - true_vol).max():.2e}")
+
+    # one vol per contract for a million lookups, and through the model
+    n = 1000000
+    rng = np.random.default_rng(0)
+    K_n, T_n = rng.uniform(60, 150, n), rng.uniform(0.05, 2.0, n)
+    start = time.time()
+    surface.vol(K_n, T_n)
+    print(f"{n} lookups in {time.time() - start:.3f}s")
+
+    stock = Stock(None, None, 'AAPL', spot_price = spot, sigma = 0.2, dividend_yield = q)
+    bs_model.set_vol_surface('AAPL', surface)
+    chain = [EuropeanPutOption(stock, 0.5, k) for k in (70, 85, 100)] + [EuropeanCallOption(stock, 0.5, 120)]
+    print('Surface vols:', surface.vol([70, 85, 100, 120], 0.5))
+    print('Chain prices:', bs_model.calc_model_price_batch(chain))
+
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,200 @@
+'''
+@project       : Temple University CIS 4360 Computational Methods in Finance
+@Instructor    : Dr. Alex Pang
+
+@Student Name  : brandon zheng
+
+@Date          : 12/2023
+
+Historical Volatility Estimators
+
+'''
+
+import os
+import datetime
+import sqlite3
+import numpy as np
+import pandas as pd
+
+import option
+from stock import Stock
+
+
+def load_ohlcv_panel(db_connection, tickers, start_date, end_date):
+    '''
+    read the EquityDailyPrice rows of all tickers with one query and pivot them into wide
+    (date x ticker) DataFrames, returned as a dict keyed by Open, High, Low, Close and Volume
+    '''
+    placeholders = ','.join(['?'] * len(tickers))
+    sql = f"select Ticker, AsOfDate, Open, High, Low, Close, Volume from EquityDailyPrice " \
+          f"where Ticker in ({placeholders}) and substr(AsOfDate, 1, 10) between ? and ? order by AsOfDate asc"
+    df = pd.read_sql(sql, db_connection, params = list(tickers) + [str(start_date), str(end_date)])
+    df['AsOfDate'] = pd.to_datetime(df['AsOfDate'].str[:10]).dt.date
+
+    panel = {}
+    for field in ('Open', 'High', 'Low', 'Close', 'Volume'):
+        wide = df.pivot(index = 'AsOfDate', columns = 'Ticker', values = field)
+        panel[field] = wide.reindex(columns = list(tickers))
+    return panel
+
+
+class VolatilityEstimator(object):
+    '''
+    Rolling annualized volatility estimators over wide (date x ticker) arrays
+
+    Every estimator takes 2-d arrays with one column per ticker and returns an array of the same shape,
+    row t is the estimate over the window ending on day t (nan until a full window of valid data is available)
+    '''
+
+    CLOSE_TO_CLOSE = 'close_to_close'
+    PARKINSON = 'parkinson'
+    GARMAN_KLASS = 'garman_klass'
+    ROGERS_SATCHELL = 'rogers_satchell'
+    YANG_ZHANG = 'yang_zhang'
+
+    def __init__(self, window = 21, trading_days = 252):
+        self.window = window
+        self.trading_days = trading_days
+
+    def estimate(self, estimator, open_, high, low, close):
+        # dispatch by estimator name
+        if estimator == VolatilityEstimator.CLOSE_TO_CLOSE:
+            return self.close_to_close(close)
+        elif estimator == VolatilityEstimator.PARKINSON:
+            return self.parkinson(high, low)
+        elif estimator == VolatilityEstimator.GARMAN_KLASS:
+            return self.garman_klass(open_, high, low, close)
+        elif estimator == VolatilityEstimator.ROGERS_SATCHELL:
+            return self.rogers_satchell(open_, high, low, close)
+        elif estimator == VolatilityEstimator.YANG_ZHANG:
+            return self.yang_zhang(open_, high, low, close)
+        raise Exception(f"Unsupported volatility estimator {estimator}")
+
+    def close_to_close(self, close):
+        returns = _log_ratio(close, _lag(close))
+        return self._annualize(self._rolling_var(returns))
+
+    def parkinson(self, high, low):
+        hl = _log_ratio(high, low)
+        return self._annualize(self._rolling_mean(hl ** 2 / (4 * np.log(2))))
+
+    def garman_klass(self, open_, high, low, close):
+        hl = _log_ratio(high, low)
+        co = _log_ratio(close, open_)
+        return self._annualize(self._rolling_mean(0.5 * hl ** 2 - (2 * np.log(2) - 1) * co ** 2))
+
+    def rogers_satchell(self, open_, high, low, close):
+        return self._annualize(self._rolling_mean(_rogers_satchell_term(open_, high, low, close)))
+
+    def yang_zhang(self, open_, high, low, close):
+        # overnight, open-to-close and Rogers-Satchell variances combined with the Yang-Zhang weight
+        overnight = _log_ratio(open_, _lag(close))
+        open_close = _log_ratio(close, open_)
+        rs = _rogers_satchell_term(open_, high, low, close)
+        # the first day has no previous close, keep all three terms on the same rows
+        rs[0] = np.nan
+        n = self.window
+        k = 0.34 / (1.34 + (n + 1) / (n - 1))
+        var = self._rolling_var(overnight) + k * self._rolling_var(open_close) + (1 - k) * self._rolling_mean(rs)
+        return self._annualize(var)
+
+    def _annualize(self, var):
+        return np.sqrt(np.maximum(var, 0.0) * self.trading_days)
+
+    def _rolling_mean(self, x):
+        # mean over the trailing window along axis 0 via cumulative sums, nan if the window has any nan
+        n = self.window
+        x = np.asarray(x, dtype = float)
+        valid = np.isfinite(x)
+        sums = np.cumsum(np.where(valid, x, 0.0), axis = 0)
+        counts = np.cumsum(valid, axis = 0)
+        result = np.full(x.shape, np.nan)
+        if x.shape[0] < n:
+            return result
+        window_sum = sums[n - 1:].copy()
+        window_sum[1:] -= sums[:-n]
+        window_count = counts[n - 1:].copy()
+        window_count[1:] -= counts[:-n]
+        result[n - 1:] = np.where(window_count == n, window_sum / n, np.nan)
+        return result
+
+    def _rolling_var(self, x):
+        # sample variance over the trailing window
+        n = self.window
+        mean = self._rolling_mean(x)
+        mean_sq = self._rolling_mean(np.asarray(x, dtype = float) ** 2)
+        return (mean_sq - mean ** 2) * n / (n - 1)
+
+
+def _lag(x):
+    # shift down one row, the first row becomes nan
+    x = np.asarray(x, dtype = float)
+    lagged = np.empty_like(x)
+    lagged[0] = np.nan
+    lagged[1:] = x[:-1]
+    return lagged
+
+def _log_ratio(a, b):
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        return np.log(np.asarray(a, dtype = float) / np.asarray(b, dtype = float))
+
+def _rogers_satchell_term(open_, high, low, close):
+    return _log_ratio(high, close) * _log_ratio(high, open_) + _log_ratio(low, close) * _log_ratio(low, open_)
+
+
+def fill_sigma(stocks, db_connection, start_date, end_date, estimator = 'yang_zhang', window = 21):
+    '''
+    set sigma on every Stock from the latest rolling estimate, all tickers in one batched call.
+    Stocks without a valid estimate keep their sigma. Returns a Series of the estimates by ticker
+    '''
+    tickers = [s.ticker for s in stocks]
+    panel = load_ohlcv_panel(db_connection, tickers, start_date, end_date)
+    vol = VolatilityEstimator(window).estimate(estimator, panel['Open'].values, panel['High'].values,
+                                               panel['Low'].values, panel['Close'].values)
+
+    # latest valid estimate per column
+    valid = np.isfinite(vol)
+    last = np.where(valid.any(axis = 0), vol.shape[0] - 1 - np.argmax(valid[::-1], axis = 0), -1)
+    latest = np.where(last >= 0, vol[np.maximum(last, 0), np.arange(vol.shape[1])], np.nan)
+
+    for stock, sigma in zip(stocks, latest):
+        if np.isfinite(sigma):
+            stock.sigma = float(sigma)
+    return pd.Series(latest, index = tickers)
+
+
+def _test():
+    # synthetic OHLC for 200 tickers with known volatility
+    rng = np.random.default_rng(0)
+    n_days, n_tickers, n_intraday = 500, 200, 50
+    true_sigma = rng.uniform(0.1, 0.6, n_tickers)
+    daily = true_sigma / np.sqrt(252)
+    # each day is split into intraday steps to build the high and low, the range estimators read
+    # slightly low because the discrete path misses part of the true range
+    steps = rng.normal(0, daily / np.sqrt(n_intraday), (n_days, n_intraday, n_tickers))
+    path = np.cumsum(steps.reshape(-1, n_tickers), axis = 0).reshape(n_days, n_intraday, n_tickers)
+    open_ = np.exp(np.concatenate([np.zeros((1, n_tickers)), path[:-1, -1]]))
+    close = np.exp(path[:, -1])
+    high = np.maximum(np.exp(path.max(axis = 1)), np.maximum(open_, close))
+    low = np.minimum(np.exp(path.min(axis = 1)), np.minimum(open_, close))
+
+    estimator = VolatilityEstimator(window = 63)
+    for name in (VolatilityEstimator.CLOSE_TO_CLOSE, VolatilityEstimator.PARKINSON, VolatilityEstimator.GARMAN_KLASS,
+                 VolatilityEstimator.ROGERS_SATCHELL, VolatilityEstimator.YANG_ZHANG):
+        vol = estimator.estimate(name, open_, high, low, close)
+        print(f"{name:<16} mean ratio to true sigma {np.nanmean(vol / true_sigma):.3f}")
+
+    # fill sigma from the database for a few tickers
+    parser = option.get_default_parser()
+    parser.add_argument('--data_dir', dest = 'data_dir', default = './data', help = 'data dir')
+    args = parser.parse_args()
+    opt = option.Option(args = args)
+    opt.sqlite_db = os.path.join(opt.data_dir, "sqlitedb/Equity.db")
+    if os.path.exists(opt.sqlite_db):
+        db_connection = sqlite3.connect(opt.sqlite_db)
+        stocks = [Stock(opt, db_connection, t) for t in ('AAPL', 'MSFT', 'NVDA')]
+        print(fill_sigma(stocks, db_connection, datetime.date(2023, 1, 1), datetime.date(2023, 12, 1)))
+
+
+if __name__ == "__main__":
+    _test()